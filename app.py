@@ -1,5 +1,16 @@
+import time
+# Startup time is reported from here, before the heavy imports.
+STARTED_AT = time.perf_counter()
 from config import DefaultConfig
 from bots import FlightSearchBot
+from helpers.airports import AirportIndex
+from helpers.dates import DateParser
+from helpers.caching import ResultCache
+from helpers.offers import offers_size
+from helpers.services import FanOutExecutor, UpstreamGuard, Prefetcher
+from helpers.storage import SqliteStorage, RedisStorage
+from helpers.metrics import MetricsRegistry, LoopLagMonitor, LoopWatchdog, TurnProfiler
+from models import StateCodec
 from botbuilder.schema import Activity, ActivityTypes
 from botbuilder.core.integration import aiohttp_error_middleware
 from botbuilder.core import (
@@ -12,6 +23,8 @@ from botbuilder.core import (
 )
 from aiohttp.web import Request, Response, json_response
 from aiohttp import web
+import asyncio
+import gc
 import sys
 import traceback
 from datetime import datetime
@@ -20,10 +33,26 @@ load_dotenv()
 
 CONFIG = DefaultConfig()
 
+# Prometheus metrics of this process, served on /metrics/prometheus
+METRICS = MetricsRegistry()
+SEND_SECONDS = METRICS.histogram(
+    "flight_bot_send_activities_seconds", "Latency of posting replies to the channel")
+
+
+class InstrumentedAdapter(BotFrameworkAdapter):
+    # Times the posts of the bot's replies to the channel connector.
+    async def send_activities(self, context: TurnContext, activities):
+        if not activities:
+            # a reply held by the turn's ActivityBuffer, posted when it flushes
+            return []
+        with SEND_SECONDS.time():
+            return await super().send_activities(context, activities)
+
+
 # Create adapter.
 # See https://aka.ms/about-bot-adapter to learn more about how bots work.
 SETTINGS = BotFrameworkAdapterSettings(CONFIG.APP_ID, CONFIG.APP_PASSWORD)
-ADAPTER = BotFrameworkAdapter(SETTINGS)
+ADAPTER = InstrumentedAdapter(SETTINGS)
 
 
 # Catch-all for errors.
@@ -58,13 +87,65 @@ async def on_error(context: TurnContext, error: Exception):
 
 ADAPTER.on_turn_error = on_error
 
+def create_storage(config: DefaultConfig):
+    if config.STATE_STORAGE == "sqlite":
+        return SqliteStorage(config.STATE_STORAGE_URL, ttl=config.STATE_TTL, codec=StateCodec())
+    if config.STATE_STORAGE == "redis":
+        return RedisStorage(config.STATE_STORAGE_URL, ttl=config.STATE_TTL, codec=StateCodec())
+    return MemoryStorage()
+
+
+def create_upstream_guard(name: str, rate: float, burst: int, config: DefaultConfig):
+    return UpstreamGuard(name, rate, burst, max_wait=config.UPSTREAM_MAX_WAIT,
+                         failure_threshold=config.UPSTREAM_FAILURE_THRESHOLD,
+                         reset_timeout=config.UPSTREAM_RESET_SECONDS)
+
+
+RECOGNIZERS_SECONDS = None
 try:
-    # Create MemoryStorage, ConversationState, UserState
-    MEMORY = MemoryStorage()
+    # Create the state storage, ConversationState, UserState
+    MEMORY = create_storage(CONFIG)
     CONVERSATION_STATE = ConversationState(MEMORY)
     USER_STATE = UserState(MEMORY)
 
-    BOT = FlightSearchBot(CONVERSATION_STATE, USER_STATE)
+    LOOP_LAG = LoopLagMonitor(METRICS, CONFIG.LOOP_LAG_INTERVAL)
+    # Opt-in diagnostics of stalls: blocked event loop stacks and profiles
+    # of slow turns
+    WATCHDOG = LoopWatchdog(CONFIG.LOOP_WATCHDOG_SECONDS) if CONFIG.LOOP_WATCHDOG_SECONDS else None
+    TURN_PROFILER = TurnProfiler(
+        CONFIG.PROFILE_DIR, CONFIG.PROFILE_SAMPLE_RATE, CONFIG.PROFILE_SLOW_TURN_SECONDS,
+        CONFIG.PROFILE_MAX_FILES) if CONFIG.PROFILE_DIR else None
+
+    # Load the local airport dataset once at startup when one is configured
+    AIRPORT_INDEX = AirportIndex.from_csv(
+        CONFIG.AIRPORT_INDEX_PATH) if CONFIG.AIRPORT_INDEX_PATH else None
+
+    BOT = FlightSearchBot(CONVERSATION_STATE, USER_STATE,
+                          AIRPORT_INDEX, CONFIG.AIRPORT_REMOTE_FALLBACK,
+                          DateParser(CONFIG.DATE_PARSER_PROCESSES),
+                          ResultCache(CONFIG.OFFER_CACHE_MAX_BYTES,
+                                      CONFIG.OFFER_CACHE_FRESH_SECONDS,
+                                      CONFIG.OFFER_CACHE_STALE_SECONDS,
+                                      sizeof=offers_size),
+                          FanOutExecutor(CONFIG.FAN_OUT_CONCURRENCY, CONFIG.FAN_OUT_TIMEOUT),
+                          create_upstream_guard(
+                              "amadeus", CONFIG.AMADEUS_RATE_LIMIT, CONFIG.AMADEUS_BURST, CONFIG),
+                          create_upstream_guard(
+                              "airport_codes", CONFIG.AIRPORT_CODES_RATE_LIMIT,
+                              CONFIG.AIRPORT_CODES_BURST, CONFIG),
+                          Prefetcher(CONFIG.PREFETCH_MAX_TASKS),
+                          METRICS, TURN_PROFILER)
+
+    if CONFIG.WARM_UP_RECOGNIZERS:
+        # Compile the models before any worker process is forked so that
+        # they are shared copy-on-write instead of rebuilt per process.
+        RECOGNIZERS_SECONDS = round(BOT.date_parser.warm_up(), 3)
+        print(f"\n [startup] recognizers warmed in {RECOGNIZERS_SECONDS}s",
+              file=sys.stderr)
+    # Keep the startup objects out of the collector so that its passes do
+    # not touch, and so copy, the shared pages. gc.freeze is Python 3.7+.
+    if hasattr(gc, "freeze"):
+        gc.freeze()
 except Exception as err:
     print(f"\n [unhandled error]: {err}")
 
@@ -88,16 +169,87 @@ async def messages(req: Request) -> Response:
     return Response(status=201)
 
 
+# Startup progress reported by the readiness route.
+STARTUP = {"ready": False, "warm": False,
+           "recognizers_seconds": RECOGNIZERS_SECONDS}
+
+
+def airport_suggestions(req: Request) -> Response:
+    # Typeahead for airport inputs, e.g. /api/airports?q=nai&limit=5
+    try:
+        limit = min(int(req.query.get("limit", 8)), 20)
+    except ValueError:
+        return Response(status=400)
+    return json_response(data={"airports": BOT.suggest_airports(req.query.get("q", ""), limit)})
+
+
+def metrics(req: Request) -> Response:
+    # Cache hit ratios and the upstream calls they saved.
+    stats = BOT.stats()
+    if WATCHDOG is not None:
+        stats["loop_watchdog"] = WATCHDOG.stats()
+    return json_response(data=stats)
+
+
+def prometheus_metrics(req: Request) -> Response:
+    # Turn and step latencies, upstream calls, cache hits and event loop lag.
+    return Response(text=METRICS.render(), content_type="text/plain")
+
+
 def healthcheck(req: Request) -> Response:
+    # Liveness: the process is up and serving requests.
     return Response(status=200)
 
 
+def readiness(req: Request) -> Response:
+    # Readiness: the startup warm up has finished, successfully or not.
+    status = 200 if STARTUP["ready"] else 503
+    return json_response(data=STARTUP, status=status)
+
+
+async def warm_up():
+    try:
+        await BOT.warm_up()
+        STARTUP["warm"] = True
+    except Exception as error:
+        # Credentials are fetched again on first use.
+        print(f"\n [warm_up] failed: {error}", file=sys.stderr)
+    finally:
+        STARTUP["ready"] = True
+        STARTUP["startup_seconds"] = round(time.perf_counter() - STARTED_AT, 3)
+        print(f"\n [startup] ready in {STARTUP['startup_seconds']}s", file=sys.stderr)
+
+
+async def on_startup(app: web.Application):
+    # Warm up in the background so that the server accepts traffic right away.
+    app["warm_up"] = asyncio.ensure_future(warm_up())
+    LOOP_LAG.start()
+    if WATCHDOG is not None:
+        WATCHDOG.start()
+
+
+async def on_cleanup(app: web.Application):
+    app["warm_up"].cancel()
+    LOOP_LAG.stop()
+    if WATCHDOG is not None:
+        WATCHDOG.stop()
+    await BOT.close()
+    if hasattr(MEMORY, "close"):
+        await MEMORY.close()
+
+
 APP = web.Application(middlewares=[aiohttp_error_middleware])
 APP.router.add_post("/api/messages", messages)
+APP.router.add_get("/api/airports", airport_suggestions)
 APP.router.add_get("/", healthcheck)
+APP.router.add_get("/ready", readiness)
+APP.router.add_get("/metrics", metrics)
+APP.router.add_get("/metrics/prometheus", prometheus_metrics)
+APP.on_startup.append(on_startup)
+APP.on_cleanup.append(on_cleanup)
 
 if __name__ == "__main__":
     try:
-        web.run_app(APP, host="localhost", port=CONFIG.PORT)
+        web.run_app(APP, host=CONFIG.HOST, port=CONFIG.PORT)
     except Exception as error:
         raise error
@@ -0,0 +1,54 @@
+""" Compares the recognizer-only date parsing with the tiered DateParser """
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recognizers_date_time import recognize_datetime  # noqa: E402
+from recognizers_number import Culture  # noqa: E402
+
+from helpers.dates import DateParser  # noqa: E402
+
+INPUTS = [
+    "tomorrow", "2026-12-01", "12/01/2026", "friday", "next friday",
+    "day after tomorrow", "in two weeks", "on monday", "1st of december",
+    "today",
+]
+ROUNDS = 20
+
+
+def recognizer_only(phrases):
+    for phrase in phrases:
+        for result in recognize_datetime(phrase, Culture.English):
+            list(result.resolution["values"])
+
+
+async def tiered(parser, phrases):
+    for phrase in phrases:
+        await parser.resolve(phrase)
+
+
+def report(name, count, elapsed):
+    print(f"{name:<24}{count / elapsed:>10.0f} answers/s"
+          f"{elapsed / count * 1e6:>12.0f} us/answer")
+
+
+def main():
+    phrases = INPUTS * ROUNDS
+    start = time.perf_counter()
+    recognizer_only(phrases)
+    report("recognizer only", len(phrases), time.perf_counter() - start)
+
+    loop = asyncio.get_event_loop()
+    for processes in (0, 1):
+        parser = DateParser(processes)
+        start = time.perf_counter()
+        loop.run_until_complete(tiered(parser, phrases))
+        report(f"DateParser({processes})", len(phrases), time.perf_counter() - start)
+        parser.close()
+
+
+if __name__ == "__main__":
+    main()
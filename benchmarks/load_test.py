@@ -0,0 +1,319 @@
+"""
+  Load test of the /api/messages handler with full conversations.
+
+  Virtual users go from the welcome card through destination, origin,
+  return trip, dates, cabin class and passengers, then modify the cabin
+  class, against local stubs of the air-port-codes, Amadeus and Bot
+  Connector APIs with a configurable latency. Reports the throughput, the
+  turn latency percentiles and the memory growth, and exits with status 1
+  when --max-p99 or --min-throughput are not met.
+
+    python benchmarks/load_test.py --users 20 --conversations 200
+
+  By default the app runs in this process. To load a separate server, e.g.
+  server.py, start the stubs with --stubs-only, start the server with the
+  printed environment and pass its url with --target (and its pid with
+  --pid to report its memory).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+from aiohttp import ClientSession, web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+AIRPORTS = {
+    "london": [{"iata": "LHR", "name": "Heathrow", "city": "London"},
+               {"iata": "LGW", "name": "Gatwick", "city": "London"}],
+    "nairobi": [{"iata": "NBO", "name": "Jomo Kenyatta International", "city": "Nairobi"}],
+}
+ERROR_REPLY = "The bot encountered an error or bug."
+
+
+def conversation_script(search: int = 0):
+    """ The activities a virtual user sends, as (step, fields) pairs """
+    travel_date = date.today() + timedelta(days=30 + search)
+    return_date = travel_date + timedelta(days=7)
+    return [
+        ("welcome", {"type": "conversationUpdate"}),
+        ("book flight", {"text": "book_flight"}),
+        ("destination", {"text": "London"}),
+        ("destination choice", {"text": "LHR"}),
+        ("origin", {"text": "Nairobi"}),
+        ("origin choice", {"text": "NBO"}),
+        ("return trip", {"text": "yes"}),
+        ("travel date", {"text": travel_date.isoformat()}),
+        ("return date", {"text": return_date.isoformat()}),
+        ("cabin class", {"text": "Economy"}),
+        ("passengers", {"value": {"adults": 1, "children": 0, "infants": 0}}),
+        ("modify", {"text": "modify"}),
+        ("modify cabin class", {"text": "Cabin Class"}),
+        ("new cabin class", {"text": "Business"}),
+    ]
+
+
+def flight_offer(index: int, rnd: random.Random) -> dict:
+    segments = rnd.randint(1, 3)
+    itinerary = {
+        "duration": f"PT{rnd.randint(8, 30)}H{rnd.randint(0, 59)}M",
+        "segments": [{"departure": {"iataCode": "NBO", "at": f"2030-01-01T{rnd.randint(0, 23):02d}:00:00"},
+                      "arrival": {"iataCode": "LHR", "at": "2030-01-02T06:30:00"},
+                      "carrierCode": "KQ", "number": str(100 + segment)}
+                     for segment in range(segments)],
+    }
+    return {"type": "flight-offer", "id": str(index), "itineraries": [itinerary, itinerary],
+            "price": {"currency": "KES", "total": "1", "grandTotal": f"{rnd.randint(50000, 200000)}.00"},
+            "validatingAirlineCodes": ["KQ"], "travelerPricings": [{"fareDetailsBySegment": "x" * 2000}]}
+
+
+class Stubs:
+    """ Local stand-ins for the upstream APIs and the Bot Connector """
+
+    def __init__(self, latency: float, offers: int):
+        self.latency = latency
+        self.offers = offers
+        self.calls = {"airports": 0, "token": 0, "offers": 0, "replies": 0}
+        self.errors = 0
+        self._bodies = {}
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/airports", self.airports)
+        app.router.add_post("/token", self.token)
+        app.router.add_get("/offers", self.flight_offers)
+        app.router.add_post("/v3/conversations/{conversation}/activities", self.reply)
+        app.router.add_post("/v3/conversations/{conversation}/activities/{activity}", self.reply)
+        return app
+
+    def environment(self, url: str) -> dict:
+        return {
+            "AirportSearchApi": f"{url}/airports",
+            "AmadeusAuthenticationApi": f"{url}/token",
+            "FlightOffersApi": f"{url}/offers",
+            "AMADEUS_API_KEY": "load-test",
+            "AMADEUS_API_SECRET": "load-test",
+            "AIRPORT_CODES_API_KEY": "load-test",
+            "AIRPORT_CODES_API_SECRET": "load-test",
+        }
+
+    async def airports(self, request):
+        self.calls["airports"] += 1
+        await asyncio.sleep(self.latency)
+        term = (await request.post()).get("term", "").lower()
+        airports = AIRPORTS.get(term, AIRPORTS["london"])
+        return web.json_response({"statusCode": 200, "airports": airports})
+
+    async def token(self, request):
+        self.calls["token"] += 1
+        await asyncio.sleep(self.latency)
+        return web.json_response({"access_token": "load-test", "expires_in": 1799})
+
+    async def flight_offers(self, request):
+        self.calls["offers"] += 1
+        await asyncio.sleep(self.latency)
+        body = self._offers_body(request.query)
+        response = web.StreamResponse()
+        response.content_type = "application/json"
+        await response.prepare(request)
+        for start in range(0, len(body), 16384):
+            await response.write(body[start:start + 16384])
+        await response.write_eof()
+        return response
+
+    async def reply(self, request):
+        self.calls["replies"] += 1
+        activity = await request.json()
+        if activity.get("text") == ERROR_REPLY:
+            self.errors += 1
+        return web.json_response({"id": str(uuid.uuid4())})
+
+    def _offers_body(self, query) -> bytes:
+        key = tuple(sorted(query.items()))
+        if key not in self._bodies:
+            rnd = random.Random(str(key))
+            count = int(query.get("max", self.offers))
+            data = sorted((flight_offer(index, rnd) for index in range(count)),
+                          key=lambda offer: float(offer["price"]["grandTotal"]))
+            self._bodies[key] = json.dumps({"meta": {"count": count}, "data": data}).encode()
+        return self._bodies[key]
+
+
+async def serve(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def rss_bytes(pid: int) -> int:
+    """ Resident memory of the process, its peak where /proc is not available """
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        if pid != os.getpid():
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+async def run_conversation(session: ClientSession, target: str, service_url: str,
+                           search: int, latencies: dict, failures: list):
+    conversation = str(uuid.uuid4())
+    user = {"id": f"user-{conversation}", "name": "Load test"}
+    bot = {"id": "bot", "name": "Flight search"}
+    for step, fields in conversation_script(search):
+        activity = dict(
+            {"type": "message", "id": str(uuid.uuid4()), "channelId": "load-test",
+             "serviceUrl": service_url, "from": user, "recipient": bot,
+             "conversation": {"id": conversation}},
+            **fields)
+        if activity["type"] == "conversationUpdate":
+            activity["membersAdded"] = [user]
+        started = time.perf_counter()
+        try:
+            async with session.post(f"{target}/api/messages", json=activity) as response:
+                await response.read()
+                if response.status >= 400:
+                    failures.append(f"{step}: HTTP {response.status}")
+        except Exception as error:
+            failures.append(f"{step}: {error!r}")
+        latencies.setdefault(step, []).append(time.perf_counter() - started)
+
+
+async def load(target: str, service_url: str, users: int, conversations: int, searches: int = 1):
+    """ Run conversations with users of them at a time, returns (latencies by step, failures, seconds) """
+    latencies = {}
+    failures = []
+    queue = asyncio.Queue()
+    for index in range(conversations):
+        queue.put_nowait(index % searches)
+
+    async def user(session):
+        while not queue.empty():
+            search = queue.get_nowait()
+            await run_conversation(session, target, service_url, search, latencies, failures)
+
+    async with ClientSession() as session:
+        started = time.perf_counter()
+        await asyncio.gather(*[user(session) for _ in range(users)])
+        return latencies, failures, time.perf_counter() - started
+
+
+def report(args, stubs: Stubs, latencies: dict, failures: list, seconds: float,
+           rss_before: int, rss_after: int) -> dict:
+    turns = sorted(value for values in latencies.values() for value in values)
+    result = {
+        "users": args.users,
+        "conversations": args.conversations,
+        "turns": len(turns),
+        "seconds": round(seconds, 3),
+        "turns_per_second": round(len(turns) / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(percentile(turns, 0.5) * 1000, 1),
+        "p90_ms": round(percentile(turns, 0.9) * 1000, 1),
+        "p99_ms": round(percentile(turns, 0.99) * 1000, 1),
+        "max_ms": round(turns[-1] * 1000, 1) if turns else 0.0,
+        "failures": len(failures) + stubs.errors,
+        "rss_before_mb": round(rss_before / (1 << 20), 1),
+        "rss_after_mb": round(rss_after / (1 << 20), 1),
+        "rss_growth_mb": round((rss_after - rss_before) / (1 << 20), 1),
+        "upstream_calls": dict(stubs.calls),
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return result
+
+    print(f"{'step':<22}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, _ in conversation_script():
+        values = sorted(latencies.get(step, []))
+        print(f"{step:<22}" + "".join(
+            f"{percentile(values, fraction) * 1000:>10.1f}" for fraction in (0.5, 0.9, 0.99, 1)))
+    print()
+    for name, value in result.items():
+        print(f"{name:<22}{value}")
+    for failure in failures[:10]:
+        print(f"  failed {failure}")
+    return result
+
+
+async def main(args) -> int:
+    stubs = Stubs(args.latency, args.offers)
+    stub_runner = await serve(stubs.application(), args.stub_port)
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    environment = stubs.environment(stub_url)
+    if args.stubs_only:
+        print("Stubs running, start the bot with:")
+        for name, value in environment.items():
+            print(f"  export {name}={value}")
+        while True:
+            await asyncio.sleep(3600)
+
+    bot_runner = None
+    target = args.target
+    pid = args.pid or os.getpid()
+    if target is None:
+        # the routes are read when the app is imported
+        os.environ.update(environment)
+        import app
+        bot_runner = await serve(app.APP, args.bot_port)
+        target = f"http://127.0.0.1:{args.bot_port}"
+
+    # one conversation first so that caches, pools and tokens are warm
+    await load(target, stub_url, 1, 1)
+    rss_before = rss_bytes(pid)
+    latencies, failures, seconds = await load(
+        target, stub_url, args.users, args.conversations, args.searches)
+    rss_after = rss_bytes(pid)
+    result = report(args, stubs, latencies, failures, seconds, rss_before, rss_after)
+
+    if bot_runner is not None:
+        await bot_runner.cleanup()
+    await stub_runner.cleanup()
+
+    status = 0
+    if result["failures"]:
+        print(f"{result['failures']} turns failed", file=sys.stderr)
+        status = 1
+    if args.max_p99 is not None and result["p99_ms"] > args.max_p99:
+        print(f"p99 {result['p99_ms']}ms is over {args.max_p99}ms", file=sys.stderr)
+        status = 1
+    if args.min_throughput is not None and result["turns_per_second"] < args.min_throughput:
+        print(f"{result['turns_per_second']} turns/s is under {args.min_throughput}", file=sys.stderr)
+        status = 1
+    return status
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--users", type=int, default=20, help="conversations running at once")
+    parser.add_argument("--conversations", type=int, default=200, help="conversations in total")
+    parser.add_argument("--searches", type=int, default=10,
+                        help="distinct travel dates, fewer searches mean more offer cache hits")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds each stub call takes")
+    parser.add_argument("--offers", type=int, default=250, help="offers per flight search")
+    parser.add_argument("--stub-port", type=int, default=8790)
+    parser.add_argument("--bot-port", type=int, default=8791)
+    parser.add_argument("--target", help="url of a running bot instead of the in-process app")
+    parser.add_argument("--pid", type=int, help="pid of the --target server, for its memory")
+    parser.add_argument("--stubs-only", action="store_true", help="only run the stubs")
+    parser.add_argument("--max-p99", type=float, help="fail when the p99 turn latency is over this many ms")
+    parser.add_argument("--min-throughput", type=float, help="fail when fewer turns/s are served")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.get_event_loop().run_until_complete(main(parse_args())))
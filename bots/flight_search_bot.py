@@ -1,10 +1,12 @@
 import os
+import sys
 import json
-from urllib.parse import urlencode
-from datetime import datetime
+import asyncio
+import time
 
-from recognizers_number import recognize_number, Culture
-from recognizers_date_time import recognize_datetime
+from aiohttp import ClientError
+from urllib.parse import urlencode
+from datetime import date, datetime, timedelta
 
 from botbuilder.core import (
     ActivityHandler,
@@ -23,26 +25,111 @@ from botbuilder.schema import (
     Attachment,
     AttachmentLayoutTypes,
     Activity,
-    ActivityTypes
+    ActivityTypes,
+    SuggestedActions,
 )
 
-from resources import CustomAdaptiveCard
+from resources import (
+    CustomAdaptiveCard,
+    HeroCards,
+    CardTemplate,
+    FLIGHT_SUMMARY_TEMPLATE,
+    slot,
+    serialize_card,
+    static_attachment,
+    HERO_CARD,
+    ADAPTIVE_CARD,
+)
 from models import (
     FlightSearch,
     ConversationFlow,
     Question,
     State,
     ChatState,
+    OfferBrowsing,
 )
 
 from helpers.authentication import Authenticate
-from helpers.services import HttpService
+from helpers.services import (
+    HttpService,
+    FanOutExecutor,
+    Prefetcher,
+    UpstreamGuard,
+    UpstreamUnavailableError,
+)
+from helpers.caching import TTLCache, ResultCache
+from helpers.airports import AirportIndex
+from helpers.storage import TurnStateSaver
+from helpers.dates import DateParser, split_flexible, FLEXIBLE_DAYS
+from helpers.authentication import AuthenticationError
+from helpers.metrics import MetricsRegistry, TurnProfiler, timed
+from helpers.activities import ActivityBuffer, flush_activities
+from helpers.offers import (
+    OfferStreamParser,
+    OfferStore,
+    OfferView,
+    FlightOffer,
+    format_duration,
+    offers_size,
+)
 from constants import (
     AIRPORT_SEARCH_API,
     FLIGHT_OFFERS_API,
     FLIGHT_SEARCH_BASE_URL,
 )
 
+AIRPORT_NOT_FOUND_MESSAGE = """I'm sorry, we couldn't retrieve that airport, 
+                maybe the keyword was ambigous or no airport has such a keyword. 
+                Please enter a different name"""
+
+FLIGHTS_NOT_FOUND_MESSAGE = "I'm sorry, we couldn't retrieve flights for you, please retry the process"
+FLIGHTS_UNAVAILABLE_MESSAGE = "I'm sorry, flight search is unavailable right now, please try again in a few minutes"
+AIRPORT_SEARCH_UNAVAILABLE_MESSAGE = "I'm sorry, airport search is unavailable right now, please try again in a few minutes"
+
+TRAVEL_DATE_PROMPT = f"Enter the date of travel, add ±{FLEXIBLE_DAYS} to also search {FLEXIBLE_DAYS} days either side"
+RETURN_DATE_PROMPT = f"Enter the date of return, add ±{FLEXIBLE_DAYS} to also search {FLEXIBLE_DAYS} days either side"
+
+POST_BACK = ActionTypes.post_back.value
+
+# Amadeus travelClass of the cabin classes offered on the cabin class card
+TRAVEL_CLASSES = {
+    "Economy": "ECONOMY",
+    "PremiumEconomy": "PREMIUM_ECONOMY",
+    "Business": "BUSINESS",
+    "First": "FIRST",
+}
+# offers parsed before the top offers are sent, the rest follow once the
+# whole response is in
+FIRST_OFFERS_BATCH = 10
+TOP_OFFERS = 3
+# cards in the carousel of the remaining offers
+MORE_OFFERS = 10
+# offers requested per date pair of a flexible dates search, only the
+# cheapest one is shown
+FLEXIBLE_OFFERS_PER_SEARCH = 5
+# seconds after which the date pairs not searched yet are left out
+FLEXIBLE_SEARCH_DEADLINE = 20
+# follow ups to a search, answered from the offers of the search and the
+# order they should be shown in
+SORT_COMMANDS = {"sort by price": "price", "sort by duration": "duration"}
+SHOW_MORE_COMMAND = "show more"
+DIRECT_FLIGHTS_COMMAND = "only direct flights"
+BROWSE_COMMANDS = [SHOW_MORE_COMMAND, DIRECT_FLIGHTS_COMMAND, *SORT_COMMANDS]
+NO_MORE_FLIGHTS_MESSAGE = "That's all the flights for this search, type modify to change it"
+UPDATED_FLIGHTS_MESSAGE = "The flights of this search have been updated, from the top again. "
+FLEXIBLE_BROWSE_MESSAGE = "Flexible dates searches only show the cheapest price of each day, " \
+                          "type modify and choose exact dates to browse their flights"
+# the most common cabin class and passengers, searched for in the background
+# once the dates are known
+PREFETCH_CABIN_CLASS = "Economy"
+PREFETCH_PASSENGERS = {"adults": 1, "children": 0, "infants": 0}
+
+# turn_state key of the question a turn answers, the label of its latency
+TURN_STEP = "flight_bot.step"
+
+# process wide cache of airport lookups keyed on the normalised search term
+AIRPORT_SEARCH_CACHE = TTLCache(max_size=5000, ttl=24 * 60 * 60)
+
 
 class ValidationResult:
     def __init__(
@@ -54,7 +141,13 @@ class ValidationResult:
 
 
 class FlightSearchBot(ActivityHandler):
-    def __init__(self, conversation_state: ConversationState, user_state: UserState):
+    def __init__(self, conversation_state: ConversationState, user_state: UserState,
+                 airport_index: AirportIndex = None, airport_remote_fallback: bool = True,
+                 date_parser: DateParser = None, offer_cache: ResultCache = None,
+                 fan_out: FanOutExecutor = None, amadeus_guard: UpstreamGuard = None,
+                 airport_codes_guard: UpstreamGuard = None, prefetcher: Prefetcher = None,
+                 metrics: MetricsRegistry = None,
+                 turn_profiler: TurnProfiler = None):
         if conversation_state is None:
             raise TypeError(
                 "[DialogBot]: Missing parameter. conversation_state is required but None was given"
@@ -72,19 +165,60 @@ class FlightSearchBot(ActivityHandler):
         self.profile_accessor = self.user_state.create_property("UserProfile")
         self.chat_state_accessor = self.conversation_state.create_property(
             "ChatState")
+        # writes the changed UserState and ConversationState once per turn
+        self.state_saver = TurnStateSaver(
+            self.conversation_state, self.user_state)
 
-        # Amadesus API authentication for flight search
+        # Amadesus API authentication for flight search, the token is fetched
+        # on the first Amadeus call and then refreshed in the background
         self.authenticate = Authenticate()
-        self.authenticate.login()
         self.http_service = self.authenticate.http_service
         self.airport_codes_http_service = HttpService()
-        self.http_service.config_service({
-            "APC-Auth": os.environ['AIRPORT_CODES_API_KEY'],
-            "APC-Auth-Secret": os.environ['AIRPORT_CODES_API_SECRET']
+        self.airport_codes_http_service.config_service({
+            "APC-Auth": os.environ.get('AIRPORT_CODES_API_KEY', ''),
+            "APC-Auth-Secret": os.environ.get('AIRPORT_CODES_API_SECRET', '')
         })
+        # rate limits and circuit breakers of the upstream APIs
+        self.amadeus_guard = amadeus_guard or UpstreamGuard("amadeus")
+        self.airport_codes_guard = airport_codes_guard or UpstreamGuard("airport_codes")
+
+        # local airport dataset, the remote API is then only used for misses
+        self.airport_index = airport_index
+        self.airport_remote_fallback = airport_remote_fallback
+        # typeahead suggestions over the local dataset, or over the airports
+        # returned by the remote API so far, ranked by the users' choices
+        self.airport_suggestions = airport_index if airport_index is not None else AirportIndex()
+        self.date_parser = date_parser or DateParser()
+        # flight offers of recent searches, keyed on the normalised search
+        self.offer_cache = offer_cache if offer_cache is not None else ResultCache(sizeof=offers_size)
+        # runs the searches of the flexible dates grid concurrently
+        self.fan_out = fan_out or FanOutExecutor()
+        # speculative offer searches run while the last questions are answered
+        self.prefetcher = prefetcher if prefetcher is not None else Prefetcher()
+
+        # latency of the turns and of the steps within them, and the cache
+        # and upstream statistics in the Prometheus format
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.turn_seconds = self.metrics.histogram(
+            "flight_bot_turn_seconds", "Turn latency by the question being answered", ("step",))
+        self.operation_seconds = self.metrics.histogram(
+            "flight_bot_operation_seconds", "Latency of the steps of a turn", ("operation",))
+        self.cache_events = self.metrics.counter(
+            "flight_bot_cache_events_total", "Cache lookups by result", ("cache", "result"))
+        self.cache_hit_ratio = self.metrics.gauge(
+            "flight_bot_cache_hit_ratio", "Share of the cache lookups that were hits", ("cache",))
+        self.upstream_calls = self.metrics.counter(
+            "flight_bot_upstream_calls_total", "Upstream calls by response status", ("upstream", "status"))
+        self.upstream_rejected = self.metrics.counter(
+            "flight_bot_upstream_rejected_total", "Upstream calls not sent, by reason",
+            ("upstream", "reason"))
+        self.upstream_open = self.metrics.gauge(
+            "flight_bot_upstream_circuit_open", "1 while the circuit breaker of the upstream is open",
+            ("upstream",))
+        self.metrics.add_collector(self._collect_metrics)
+        # profiles a sample of the turns and keeps the slow ones, off by default
+        self.turn_profiler = turn_profiler
 
-        # store a map of airport iata codes to names
-        self.airports = {}
         # store a map of all dialog question
         self.questions = {"Destination": Question.NONE,
                           "Origin": Question.DESTINATION_CHOICE,
@@ -95,12 +229,102 @@ class FlightSearchBot(ActivityHandler):
                           "Number of Passenger": Question.CABIN_CLASS
                           }
 
-    async def on_turn(self, turn_context: TurnContext):
-        await super().on_turn(turn_context)
+        # cards that do not change are built and serialised once
+        self.welcome_card = static_attachment(
+            HeroCards.create_welcome_card(), HERO_CARD)
+        self.return_trip_select_card = static_attachment(
+            HeroCards.create_return_trip_select_card(), HERO_CARD)
+        self.cabin_class_card = static_attachment(
+            HeroCards.create_cabin_class_card(), HERO_CARD)
+        self.number_of_passengers_card = static_attachment(
+            CustomAdaptiveCard.create_number_of_passengers_card(), ADAPTIVE_CARD)
+        self.modify_flight_profile_cards = {
+            return_trip: static_attachment(
+                HeroCards.create_modify_flight_profile_card(
+                    self._create_card_actions_for_modify_flight_profile(return_trip)),
+                HERO_CARD)
+            for return_trip in (True, False)
+        }
+        airport_card = serialize_card(HeroCards.create_airport_card(
+            slot("title"), slot("text"), []))
+        airport_card["buttons"] = slot("buttons")
+        self.airport_card_template = CardTemplate(airport_card, HERO_CARD)
+        self.browse_actions = SuggestedActions(actions=[
+            CardAction(type=ActionTypes.im_back, title=command.capitalize(), value=command)
+            for command in BROWSE_COMMANDS
+        ])
+        self.flight_offer_card_template = CardTemplate(
+            HeroCards.create_flight_offer_card(
+                slot("title"), slot("subtitle"), slot("text"),
+                [CardAction(type=ActionTypes.open_url, title="View Flights", value=slot("url"))]),
+            HERO_CARD)
+
+    async def warm_up(self):
+        """ Fetch the Amadeus token ahead of the first flight search """
+        await self.authenticate.ensure_token()
+
+    async def close(self):
+        """ Release the pooled upstream connections """
+        await self.authenticate.close()
+        await self.airport_codes_http_service.close()
+        self.date_parser.close()
+        self.prefetcher.close()
+
+    def suggest_airports(self, term: str, limit: int = 8):
+        """ Typeahead suggestions for a partial airport name, served without network calls """
+        return self.airport_suggestions.suggest(term, limit)
+
+    def stats(self) -> dict:
+        """ Hit ratios and upstream calls saved by the caches """
+        stats = {
+            "offer_cache": self.offer_cache.stats(),
+            "airport_search_cache": AIRPORT_SEARCH_CACHE.stats(),
+            "fan_out": self.fan_out.stats(),
+            "prefetch": self.prefetcher.stats(),
+            "upstreams": {
+                guard.name: guard.stats()
+                for guard in (self.amadeus_guard, self.airport_codes_guard)
+            },
+        }
+        if self.turn_profiler is not None:
+            stats["turn_profiler"] = self.turn_profiler.stats()
+        return stats
 
-        # Save any state changes that might have ocurred during the turn.
-        await self.conversation_state.save_changes(turn_context)
-        await self.user_state.save_changes(turn_context)
+    async def on_turn(self, turn_context: TurnContext):
+        started = time.perf_counter()
+        profile = self.turn_profiler.start() if self.turn_profiler is not None else None
+        # replies are posted together at the end of the turn
+        activity_buffer = ActivityBuffer(turn_context)
+        try:
+            try:
+                await super().on_turn(turn_context)
+            finally:
+                # also the replies sent before an error
+                await activity_buffer.close()
+
+            # Save any state changes that might have ocurred during the turn.
+            with self.operation_seconds.time("state_save"):
+                await self.state_saver.save_changes(turn_context)
+        finally:
+            seconds = time.perf_counter() - started
+            step = turn_context.turn_state.get(TURN_STEP, turn_context.activity.type)
+            self.turn_seconds.observe(seconds, step)
+            if profile is not None:
+                self.turn_profiler.finish(profile, seconds, step)
+
+    def _collect_metrics(self):
+        stats = self.stats()
+        for cache in ("offer_cache", "airport_search_cache"):
+            for result in ("hits", "misses", "coalesced", "evictions"):
+                self.cache_events.set(stats[cache][result], cache, result)
+            self.cache_hit_ratio.set(stats[cache]["hit_ratio"], cache)
+        self.cache_events.set(stats["offer_cache"]["stale_hits"], "offer_cache", "stale_hits")
+        for upstream, upstream_stats in stats["upstreams"].items():
+            for status, calls in upstream_stats["statuses"].items():
+                self.upstream_calls.set(calls, upstream, status)
+            self.upstream_rejected.set(upstream_stats["shed"], upstream, "shed")
+            self.upstream_rejected.set(upstream_stats["rejected"], upstream, "circuit_open")
+            self.upstream_open.set(int(upstream_stats["state"] == "open"), upstream)
 
     async def on_members_added_activity(
         self, members_added: [ChannelAccount], turn_context: TurnContext
@@ -118,9 +342,11 @@ class FlightSearchBot(ActivityHandler):
 
     async def on_message_activity(self, turn_context: TurnContext):
         # Get the state properties from the turn context.
-        flight_search = await self.profile_accessor.get(turn_context, FlightSearch)
-        flow = await self.flow_accessor.get(turn_context, ConversationFlow)
-        chat_state = await self.chat_state_accessor.get(turn_context, ChatState)
+        with self.operation_seconds.time("state_load"):
+            flight_search = await self.profile_accessor.get(turn_context, FlightSearch)
+            flow = await self.flow_accessor.get(turn_context, ConversationFlow)
+            chat_state = await self.chat_state_accessor.get(turn_context, ChatState)
+        turn_context.turn_state[TURN_STEP] = flow.last_question_asked.name.lower()
         if flow.last_question_asked == Question.PASSENGERS:
             user_input = [
                 turn_context.activity.value.get('adults'),
@@ -133,12 +359,16 @@ class FlightSearchBot(ActivityHandler):
             flow.last_question_asked = Question.NONE
             flow.question_being_modified = Question.COMPLETED
             chat_state.chat_state = State.NORMAL
+            self.prefetcher.cancel(turn_context.activity.conversation.id)
+            chat_state.offer_browsing = None
             await self._on_cancel(turn_context)
         elif (flow.last_question_asked == Question.COMPLETED) and (user_input == "modify"):
             chat_state.chat_state = State.MODIFY
-            buttons = self._create_card_actions_for_modify_flight_profile(
-                flight_search)
-            await self._create_modify_flight_profile_card(turn_context, buttons)
+            await self._create_modify_flight_profile_card(turn_context, flight_search)
+        elif (flow.last_question_asked == Question.COMPLETED) and (chat_state.chat_state != State.MODIFY) \
+                and (user_input.lower() in BROWSE_COMMANDS):
+            await self._browse_flight_offers(
+                turn_context, flight_search, chat_state, user_input.lower())
         elif chat_state.chat_state == State.MODIFY:
             if self._is_valid_modify_option(flow, user_input):
                 flow.question_being_modified = self.questions[user_input] if flow.question_being_modified == Question.COMPLETED \
@@ -172,17 +402,12 @@ class FlightSearchBot(ActivityHandler):
                         "Please select a valid modify option from the options below"
                     )
                 )
-                buttons = self._create_card_actions_for_modify_flight_profile()
-                await self._create_modify_flight_profile_card(turn_context, buttons)
+                await self._create_modify_flight_profile_card(turn_context, flight_search)
         elif (flow.last_question_asked == Question.NONE) and (user_input not in ["book_flight", "exit"]):
             await self._create_welcome_card(turn_context)
         else:
             await self._flight_profile(flow, flight_search, turn_context, user_input, chat_state)
 
-        # Save changes to UserState and ConversationState
-        await self.conversation_state.save_changes(turn_context)
-        await self.user_state.save_changes(turn_context)
-
     def _is_valid_modify_option(self, flow, user_input):
         options = [k for k, v in self.questions.items()]
         if flow.last_question_asked == Question.COMPLETED and user_input not in options:
@@ -201,7 +426,7 @@ class FlightSearchBot(ActivityHandler):
 
         # validate previous response and ask for destination airport choice
         elif flow.last_question_asked == Question.DESTINATION:
-            validate_result = self._search_airports_by_location(user_input)
+            validate_result = await self._search_airports_by_location(user_input)
             if not validate_result.is_valid:
                 await turn_context.send_activity(
                     MessageFactory.text(validate_result.message)
@@ -212,17 +437,25 @@ class FlightSearchBot(ActivityHandler):
                     title="Choose Destination Airport",
                     text="""Please choose the correct 
                                      Aiport that you will be going to""",
-                    buttons=self._create_card_actions_for_airport(validate_result.value))
+                    buttons=self._create_card_actions_for_airport(validate_result.value, flow))
                 flow.last_question_asked = Question.DESTINATION_CHOICE
 
         # save response
         elif flow.last_question_asked == Question.DESTINATION_CHOICE:
-            flight_search.destination = user_input
-            flight_search.destination_city = self.airports[user_input]
-            chat_state.chat_state = State.NORMAL
-            flow.question_being_modified = Question.COMPLETED
-            flow.last_question_asked = Question.COMPLETED
-            await self._display_summary_card(turn_context, flight_search)
+            validate_result = self._validate_airport_choice(flow, user_input)
+            if not validate_result.is_valid:
+                await turn_context.send_activity(
+                    MessageFactory.text(validate_result.message)
+                )
+            else:
+                flight_search.destination = user_input
+                self.airport_suggestions.record_choice(user_input)
+                flight_search.destination_city = validate_result.value
+                flow.airport_choices = {}
+                chat_state.chat_state = State.NORMAL
+                flow.question_being_modified = Question.COMPLETED
+                flow.last_question_asked = Question.COMPLETED
+                await self._complete_flight_search(turn_context, flight_search)
 
     async def _modify_flight_profile_origin(self, flow: ConversationFlow,
                                             flight_search: FlightSearch, turn_context: TurnContext, user_input, chat_state):
@@ -235,7 +468,7 @@ class FlightSearchBot(ActivityHandler):
 
         # validate previous response and  ask for airport of origin choice
         elif flow.last_question_asked == Question.ORIGIN:
-            validate_result = self._search_airports_by_location(user_input)
+            validate_result = await self._search_airports_by_location(user_input)
             if not validate_result.is_valid:
                 await turn_context.send_activity(
                     MessageFactory.text(validate_result.message)
@@ -246,25 +479,32 @@ class FlightSearchBot(ActivityHandler):
                     title="Choose Airport of Origin",
                     text="""Please choose the correct 
                                      Aiport that you will be departing from""",
-                    buttons=self._create_card_actions_for_airport(validate_result.value))
+                    buttons=self._create_card_actions_for_airport(validate_result.value, flow))
                 flow.last_question_asked = Question.ORIGIN_CHOICE
 
         # validate previous response and ask if it is a return trip
         elif flow.last_question_asked == Question.ORIGIN_CHOICE:
+            choice_result = self._validate_airport_choice(flow, user_input)
             validate_result = self._validate_origin(
                 user_input, flight_search.destination)
-            if not validate_result.is_valid:
+            if not choice_result.is_valid:
+                await turn_context.send_activity(
+                    MessageFactory.text(choice_result.message)
+                )
+            elif not validate_result.is_valid:
                 await turn_context.send_activity(
                     MessageFactory.text(validate_result.message)
                 )
                 flow.last_question_asked = Question.ORIGIN
             else:
                 flight_search.origin = user_input
-                flight_search.origin_city = self.airports[user_input]
+                self.airport_suggestions.record_choice(user_input)
+                flight_search.origin_city = choice_result.value
+                flow.airport_choices = {}
                 chat_state.chat_state = State.NORMAL
                 flow.question_being_modified = Question.COMPLETED
                 flow.last_question_asked = Question.COMPLETED
-                await self._display_summary_card(turn_context, flight_search)
+                await self._complete_flight_search(turn_context, flight_search)
 
     async def _modify_flight_profile_return_trip(self, flow: ConversationFlow,
                                                  flight_search: FlightSearch, turn_context: TurnContext, user_input, chat_state):
@@ -284,8 +524,7 @@ class FlightSearchBot(ActivityHandler):
                 flight_search.return_trip = True if validate_result.value == "yes" else False
                 if flight_search.return_trip:
                     await turn_context.send_activity(
-                        MessageFactory.text(
-                            "Enter the date of return")
+                        MessageFactory.text(RETURN_DATE_PROMPT)
                     )
                     flow.last_question_asked = Question.RETURN_DATE
                 else:
@@ -293,65 +532,68 @@ class FlightSearchBot(ActivityHandler):
                     chat_state.chat_state = State.NORMAL
                     flow.question_being_modified = Question.COMPLETED
                     flow.last_question_asked = Question.COMPLETED
-                    await self._display_summary_card(turn_context, flight_search)
+                    await self._complete_flight_search(turn_context, flight_search)
         elif flow.last_question_asked == Question.RETURN_DATE:
-            validate_result = self._validate_date(user_input)
+            validate_result, flexible = await self._validate_flexible_date(user_input)
             if not validate_result.is_valid:
                 await turn_context.send_activity(
                     MessageFactory.text(validate_result.message)
                 )
             else:
                 flight_search.return_date = validate_result.value
+                flight_search.flexible_dates = flexible
                 chat_state.chat_state = State.NORMAL
                 flow.question_being_modified = Question.COMPLETED
                 flow.last_question_asked = Question.COMPLETED
-                await self._display_summary_card(turn_context, flight_search)
+                await self._complete_flight_search(turn_context, flight_search)
 
     async def _modify_flight_profile_travel_date(self, flow: ConversationFlow,
                                                  flight_search: FlightSearch, turn_context: TurnContext, user_input, chat_state):
         # ask for travel date
         if flow.last_question_asked == Question.RETURN_TRIP:
             await turn_context.send_activity(
-                MessageFactory.text("Enter the date of travel")
+                MessageFactory.text(TRAVEL_DATE_PROMPT)
             )
             flow.last_question_asked = Question.TRAVEL_DATE
 
         # validate previous response
         elif flow.last_question_asked == Question.TRAVEL_DATE:
-            validate_result = self._validate_date(user_input)
+            validate_result, flexible = await self._validate_flexible_date(user_input)
             if not validate_result.is_valid:
                 await turn_context.send_activity(
                     MessageFactory.text(validate_result.message)
                 )
             elif flight_search.return_trip:
                 flight_search.travel_date = validate_result.value
+                flight_search.flexible_dates = flexible
                 chat_state.chat_state = State.NORMAL
                 flow.question_being_modified = Question.COMPLETED
                 flow.last_question_asked = Question.COMPLETED
-                await self._display_summary_card(turn_context, flight_search)
+                await self._complete_flight_search(turn_context, flight_search)
 
     async def _modify_flight_profile_return_date(self, flow: ConversationFlow,
                                                  flight_search: FlightSearch, turn_context: TurnContext, user_input, chat_state):
         # ask for return date
         if flow.last_question_asked == Question.TRAVEL_DATE:
             await turn_context.send_activity(
-                MessageFactory.text("Enter the date of return")
+                MessageFactory.text(RETURN_DATE_PROMPT)
             )
             flow.last_question_asked = Question.RETURN_DATE
 
         # validate previous response
         elif flow.last_question_asked == Question.RETURN_DATE:
-            validate_result = self._validate_date(user_input)
+            validate_result, flexible = await self._validate_flexible_date(user_input)
             if not validate_result.is_valid:
                 await turn_context.send_activity(
                     MessageFactory.text(validate_result.message)
                 )
             else:
                 flight_search.return_date = validate_result.value
+                flight_search.flexible_dates = flexible
                 chat_state.chat_state = State.NORMAL
                 flow.question_being_modified = Question.COMPLETED
                 flow.last_question_asked = Question.COMPLETED
-                await self._display_summary_card(turn_context, flight_search)
+                await self._complete_flight_search(turn_context, flight_search)
 
     async def _modify_flight_profile_cabin_class(self, flow: ConversationFlow,
                                                  flight_search: FlightSearch, turn_context: TurnContext, user_input, chat_state):
@@ -373,7 +615,7 @@ class FlightSearchBot(ActivityHandler):
                 chat_state.chat_state = State.NORMAL
                 flow.question_being_modified = Question.COMPLETED
                 flow.last_question_asked = Question.COMPLETED
-                await self._display_summary_card(turn_context, flight_search)
+                await self._complete_flight_search(turn_context, flight_search)
 
     async def _modify_flight_profile_number_of_passengers(self, flow: ConversationFlow,
                                                           flight_search: FlightSearch, turn_context: TurnContext, user_input, chat_state):
@@ -393,12 +635,10 @@ class FlightSearchBot(ActivityHandler):
             chat_state.chat_state = State.NORMAL
             flow.question_being_modified = Question.COMPLETED
             flow.last_question_asked = Question.COMPLETED
-            await self._display_summary_card(turn_context, flight_search)
+            await self._complete_flight_search(turn_context, flight_search)
 
     async def _flight_profile(self, flow: ConversationFlow,
                               flight_search: FlightSearch, turn_context: TurnContext, user_input, chat_state):
-        airports = {}
-
         # ask for destination
         if flow.last_question_asked == Question.NONE:
             await turn_context.send_activity(
@@ -408,7 +648,7 @@ class FlightSearchBot(ActivityHandler):
 
         # validate previous response and ask for destination airport choice
         elif flow.last_question_asked == Question.DESTINATION:
-            validate_result = self._search_airports_by_location(user_input)
+            validate_result = await self._search_airports_by_location(user_input)
             if not validate_result.is_valid:
                 await turn_context.send_activity(
                     MessageFactory.text(validate_result.message)
@@ -419,21 +659,29 @@ class FlightSearchBot(ActivityHandler):
                     title="Choose Destination Airport",
                     text="""Please choose the correct 
                                      Aiport that you will be going to""",
-                    buttons=self._create_card_actions_for_airport(validate_result.value))
+                    buttons=self._create_card_actions_for_airport(validate_result.value, flow))
                 flow.last_question_asked = Question.DESTINATION_CHOICE
 
         # validate previous response and then ask for airport of origin
         elif flow.last_question_asked == Question.DESTINATION_CHOICE:
-            flight_search.destination = user_input
-            flight_search.destination_city = self.airports[user_input]
-            await turn_context.send_activity(
-                MessageFactory.text("Which airport will you be flying from?")
-            )
-            flow.last_question_asked = Question.ORIGIN
+            validate_result = self._validate_airport_choice(flow, user_input)
+            if not validate_result.is_valid:
+                await turn_context.send_activity(
+                    MessageFactory.text(validate_result.message)
+                )
+            else:
+                flight_search.destination = user_input
+                self.airport_suggestions.record_choice(user_input)
+                flight_search.destination_city = validate_result.value
+                flow.airport_choices = {}
+                await turn_context.send_activity(
+                    MessageFactory.text("Which airport will you be flying from?")
+                )
+                flow.last_question_asked = Question.ORIGIN
 
         # validate previous response and  ask for airport of origin choice
         elif flow.last_question_asked == Question.ORIGIN:
-            validate_result = self._search_airports_by_location(user_input)
+            validate_result = await self._search_airports_by_location(user_input)
             if not validate_result.is_valid:
                 await turn_context.send_activity(
                     MessageFactory.text(validate_result.message)
@@ -444,21 +692,28 @@ class FlightSearchBot(ActivityHandler):
                     title="Choose Airport of Origin",
                     text="""Please choose the correct 
                                      Aiport that you will be departing from""",
-                    buttons=self._create_card_actions_for_airport(validate_result.value))
+                    buttons=self._create_card_actions_for_airport(validate_result.value, flow))
                 flow.last_question_asked = Question.ORIGIN_CHOICE
 
         # avalidate previous response and ask if it is a return trip
         elif flow.last_question_asked == Question.ORIGIN_CHOICE:
+            choice_result = self._validate_airport_choice(flow, user_input)
             validate_result = self._validate_origin(
                 user_input, flight_search.destination)
-            if not validate_result.is_valid:
+            if not choice_result.is_valid:
+                await turn_context.send_activity(
+                    MessageFactory.text(choice_result.message)
+                )
+            elif not validate_result.is_valid:
                 await turn_context.send_activity(
                     MessageFactory.text(validate_result.message)
                 )
                 flow.last_question_asked = Question.ORIGIN
             else:
                 flight_search.origin = user_input
-                flight_search.origin_city = self.airports[user_input]
+                self.airport_suggestions.record_choice(user_input)
+                flight_search.origin_city = choice_result.value
+                flow.airport_choices = {}
                 await self._create_return_trip_select_card(turn_context)
                 flow.last_question_asked = Question.RETURN_TRIP
 
@@ -473,39 +728,42 @@ class FlightSearchBot(ActivityHandler):
             else:
                 flight_search.return_trip = True if validate_result.value == 'yes' else False
                 await turn_context.send_activity(
-                    MessageFactory.text(
-                        "Enter the date of travel")
+                    MessageFactory.text(TRAVEL_DATE_PROMPT)
                 )
                 flow.last_question_asked = Question.TRAVEL_DATE
 
         # validate previous response and ask for return date
         elif flow.last_question_asked == Question.TRAVEL_DATE:
-            validate_result = self._validate_date(user_input)
+            validate_result, flexible = await self._validate_flexible_date(user_input)
             if not validate_result.is_valid:
                 await turn_context.send_activity(
                     MessageFactory.text(validate_result.message)
                 )
             elif flight_search.return_trip:
                 flight_search.travel_date = validate_result.value
+                flight_search.flexible_dates = flexible
                 await turn_context.send_activity(
-                    MessageFactory.text(
-                        "Enter the date of return")
+                    MessageFactory.text(RETURN_DATE_PROMPT)
                 )
                 flow.last_question_asked = Question.RETURN_DATE
             else:
                 flight_search.travel_date = validate_result.value
+                flight_search.flexible_dates = flexible
+                self._prefetch_flight_offers(turn_context, flight_search)
                 await self._create_cabin_class_card(turn_context)
                 flow.last_question_asked = Question.CABIN_CLASS
 
         # validate previous response and ask the for the passengers cabin class
         elif flow.last_question_asked == Question.RETURN_DATE:
-            validate_result = self._validate_date(user_input)
+            validate_result, flexible = await self._validate_flexible_date(user_input)
             if not validate_result.is_valid:
                 await turn_context.send_activity(
                     MessageFactory.text(validate_result.message)
                 )
             else:
                 flight_search.return_date = validate_result.value
+                flight_search.flexible_dates = flight_search.flexible_dates or flexible
+                self._prefetch_flight_offers(turn_context, flight_search)
                 await self._create_cabin_class_card(turn_context)
                 flow.last_question_asked = Question.CABIN_CLASS
 
@@ -519,6 +777,8 @@ class FlightSearchBot(ActivityHandler):
                 await self._create_cabin_class_card(turn_context)
             else:
                 flight_search.cabin_class = validate_result.value
+                if flight_search.cabin_class != PREFETCH_CABIN_CLASS:
+                    self.prefetcher.cancel(turn_context.activity.conversation.id)
                 message = Activity(
                     type=ActivityTypes.message,
                     attachments=[self._create_number_of_passengers_card()],
@@ -531,8 +791,12 @@ class FlightSearchBot(ActivityHandler):
             flight_search.adults = user_input[0]
             flight_search.children = user_input[1]
             flight_search.infants = user_input[2]
-            await self._display_summary_card(turn_context, flight_search)
             flow.last_question_asked = Question.COMPLETED
+            # the search below shares the prefetch if it asks for the same offers
+            self.prefetcher.cancel(
+                turn_context.activity.conversation.id,
+                keep_key=self._offer_cache_key(self._create_flight_offers_params(flight_search)))
+            await self._complete_flight_search(turn_context, flight_search)
         # always display the summary if user has completed
         elif flow.last_question_asked == Question.COMPLETED:
             await self._display_summary_card(turn_context, flight_search)
@@ -544,6 +808,17 @@ class FlightSearchBot(ActivityHandler):
             )
         )
 
+    async def _complete_flight_search(self, turn_context, flight_search):
+        await self._display_summary_card(turn_context, flight_search)
+        # show the summary while the offers are searched
+        await flush_activities(turn_context)
+        chat_state = await self.chat_state_accessor.get(turn_context, ChatState)
+        chat_state.offer_browsing = None
+        if flight_search.flexible_dates:
+            await self._send_flexible_dates_prices(turn_context, flight_search)
+        else:
+            await self._send_flight_offers(turn_context, flight_search, chat_state)
+
     async def _display_summary_card(self, turn_context, flight_search):
         message = Activity(
             type=ActivityTypes.message,
@@ -570,22 +845,16 @@ class FlightSearchBot(ActivityHandler):
         }
         return f"{FLIGHT_SEARCH_BASE_URL}?{urlencode(query_params)}"
 
-    async def _create_modify_flight_profile_card(self, turn_context: TurnContext, buttons):
-        card = HeroCard(
-            title="Modify Flight Profile",
-            text="Choose the question that you need to modify",
-            images=[
-                CardImage(url="https://www.bls.gov/cpi/factsheets/airline-fares-image.jpg")],
-            buttons=buttons
-        )
+    async def _create_modify_flight_profile_card(self, turn_context: TurnContext, flight_search):
         return await turn_context.send_activity(
-            MessageFactory.attachment(CardFactory.hero_card(card))
+            MessageFactory.attachment(
+                self.modify_flight_profile_cards[bool(flight_search.return_trip)])
         )
 
-    def _create_card_actions_for_modify_flight_profile(self, flight_search):
+    def _create_card_actions_for_modify_flight_profile(self, return_trip):
         buttons = []
         for k, v in self.questions.items():
-            if not (flight_search.return_trip == False and k == "Return Date"):
+            if not (return_trip == False and k == "Return Date"):
                 buttons.append(
                     CardAction(
                         type=ActionTypes.post_back,
@@ -598,169 +867,362 @@ class FlightSearchBot(ActivityHandler):
         return buttons
 
     async def _create_return_trip_select_card(self, turn_context: TurnContext):
-        card = HeroCard(
-            title="Return Trip",
-            text="Choose if the search you are doing is for a return trip or not",
-            images=[
-                CardImage(url="https://www.bls.gov/cpi/factsheets/airline-fares-image.jpg")],
-            buttons=[
-                CardAction(
-                    type=ActionTypes.post_back,
-                    title="Yes",
-                    text="yes",
-                    display_text="Yes",
-                    value="yes"
-                ),
-                CardAction(
-                    type=ActionTypes.post_back,
-                    title="No",
-                    text="no",
-                    display_text="No",
-                    value="no"
-                )
-            ]
-        )
         return await turn_context.send_activity(
-            MessageFactory.attachment(CardFactory.hero_card(card))
+            MessageFactory.attachment(self.return_trip_select_card)
         )
 
     async def _create_cabin_class_card(self, turn_context: TurnContext):
-        card = HeroCard(
-            title="Choose Cabin Class",
-            text="Please choose the cabin class for your flight",
-            images=[
-                CardImage(url="https://www.bls.gov/cpi/factsheets/airline-fares-image.jpg")],
-            buttons=[
-                CardAction(
-                    type=ActionTypes.post_back,
-                    title="Econony",
-                    text="Economy",
-                    display_text="Economy",
-                    value="Economy"
-                ),
-                CardAction(
-                    type=ActionTypes.post_back,
-                    title="Premium Economy",
-                    text="PremiumEconomy",
-                    display_text="Premium Economy",
-                    value="PremiumEconomy"
-                ),
-                CardAction(
-                    type=ActionTypes.post_back,
-                    title="Business",
-                    text="Business",
-                    display_text="Business",
-                    value="Business"
-                ),
-                CardAction(
-                    type=ActionTypes.post_back,
-                    title="First Class",
-                    text="First",
-                    display_text="First Class",
-                    value="First"
-                )
-            ]
-        )
         return await turn_context.send_activity(
-            MessageFactory.attachment(CardFactory.hero_card(card))
+            MessageFactory.attachment(self.cabin_class_card)
         )
 
     async def _create_welcome_card(self, turn_context: TurnContext):
-        text = """
-                Hello, I am here to help you search for the
-                best flight to your destination. Pleace click the 
-                Search Flights button to proceed or Cancel to leave.
-                Incase you want to exit midway, you can type exit or cancel
-            """
-        card = HeroCard(
-            title="Search Flights",
-            text=text,
-            images=[
-                CardImage(url="https://www.bls.gov/cpi/factsheets/airline-fares-image.jpg")],
-            buttons=[
-                CardAction(
-                    type=ActionTypes.post_back,
-                    title="Book Flight",
-                    text="book_flight",
-                    display_text="Book Flight",
-                    value="book_flight"
-                ),
-                CardAction(
-                    type=ActionTypes.post_back,
-                    title="Exit",
-                    text="exit",
-                    display_text="Exit",
-                    value="exit"
-                )
-            ]
-        )
         return await turn_context.send_activity(
-            MessageFactory.attachment(CardFactory.hero_card(card))
+            MessageFactory.attachment(self.welcome_card)
         )
 
     async def _create_herocard(self, turn_context: TurnContext, title, text, buttons):
-        card = HeroCard(
-            title=title,
-            text=text,
-            images=[CardImage(
-                url="https://www.aurecongroup.com/-/media/images/aurecon/content/projects/property/hanoi-airport/hanoi-airport-interior.jpg")],
-            buttons=buttons
-        )
         return await turn_context.send_activity(
-            MessageFactory.attachment(CardFactory.hero_card(card))
+            MessageFactory.attachment(self.airport_card_template.attachment(
+                {"title": title, "text": text, "buttons": buttons}))
         )
 
-    def _create_card_actions_for_airport(self, airports):
+    @timed("operation_seconds", "card_building")
+    def _create_card_actions_for_airport(self, airports, flow: ConversationFlow):
+        """ Create the airport buttons and remember the offered choices in the conversation state """
         buttons = []
-        self.airports = {}
+        flow.airport_choices = {}
         for airport in airports:
-            self.airports[airport["iata"]] = airport["city"]
-            buttons.append(
-                CardAction(
-                    type=ActionTypes.post_back,
-                    title=airport["name"],
-                    text=airport["iata"],
-                    display_text=airport["name"],
-                    value=airport["iata"]
-                )
-            )
+            flow.airport_choices[airport["iata"]] = airport["city"]
+            # wire format of a post back CardAction, see _create_herocard
+            buttons.append({
+                "type": POST_BACK,
+                "title": airport["name"],
+                "text": airport["iata"],
+                "displayText": airport["name"],
+                "value": airport["iata"],
+            })
         return buttons
 
-    def _search_flight(self, flight_search):
-        travel_date = flight_search.travel_date.split('/')
-        return_date = flight_search.return_date.split('/')
-        search_params = {
+    def _create_flight_offers_params(self, flight_search):
+        params = {
             'originLocationCode': flight_search.origin,
             'destinationLocationCode': flight_search.destination,
-            'departureDate': f"{travel_date[2]}-{travel_date[0]}-{travel_date[1]}",
-            'returnDate': f"{return_date[2]}-{return_date[0]}-{return_date[1]}",
-            'adults': 1
-
+            'departureDate': flight_search.travel_date,
+            'adults': max(int(flight_search.adults or 1), 1),
+            'children': int(flight_search.children or 0),
+            'infants': int(flight_search.infants or 0),
+            'currencyCode': 'KES',
         }
-
-        res = self.http_service.get(FLIGHT_OFFERS_API, search_params)
-        if res.status_code != 200:
-            return ValidationResult(
-                is_valid=False,
-                message="I'm sorry, we couldn't retrieve flights for you, please retry the process",
-            )
+        if flight_search.return_trip and flight_search.return_date:
+            params['returnDate'] = flight_search.return_date
+        if flight_search.cabin_class in TRAVEL_CLASSES:
+            params['travelClass'] = TRAVEL_CLASSES[flight_search.cabin_class]
+        return params
+
+    async def _search_flight(self, params, deadline=None):
+        """ Yield the Amadeus offers of the search in batches, as the response is parsed """
+        res = await self.amadeus_guard.call(
+            self.authenticate.stream_get, FLIGHT_OFFERS_API, params, deadline=deadline)
+        try:
+            if res.status_code != 200:
+                raise ValueError(
+                    f"Flight offers search failed with status {res.status_code}")
+            parser = OfferStreamParser()
+            async for chunk in res.iter_chunks():
+                offers = parser.feed(chunk)
+                if offers:
+                    yield offers
+            offers = parser.close()
+            if offers:
+                yield offers
+        finally:
+            res.release()
+
+    async def _fetch_flight_offers(self, params, on_first_batch=None, deadline=None):
+        """ All the offers of the search, passing them to on_first_batch as soon as the first batch is parsed """
+        offers = OfferStore()
+        async for batch in self._search_flight(params, deadline):
+            offers.extend(batch)
+            if on_first_batch is not None and len(offers) >= FIRST_OFFERS_BATCH:
+                await on_first_batch(offers)
+                on_first_batch = None
+        return offers
+
+    async def _send_flight_offers(self, turn_context: TurnContext, flight_search,
+                                  chat_state: ChatState):
+        """
+          Send the top offers as soon as the first batch has been parsed and
+          the rest of the cheapest ones once the whole response is in.
+          Identical searches are served from the offer cache.
+        """
+        url = self._create_flight_search_url(flight_search)
+        params = self._create_flight_offers_params(flight_search)
+        shown = []
+
+        async def send_first_batch(offers):
+            shown.extend(await self._send_top_offers(turn_context, offers, url))
+            await flush_activities(turn_context)
+
+        offers = await self._get_flight_offers(turn_context, params, send_first_batch, shown)
+        if offers is None:
+            return
+        if not shown:
+            shown = await self._send_top_offers(turn_context, offers, url)
+
+        view = OfferView(offers, url, shown)
+        rows = view.next_page(MORE_OFFERS)
+        chat_state.offer_browsing = self._offer_browsing(params, view)
+        if rows:
+            await self._send_offer_page(
+                turn_context, view, rows,
+                f"Found {len(offers)} flights, here are more of the cheapest ones")
+
+    async def _browse_flight_offers(self, turn_context: TurnContext, flight_search,
+                                    chat_state: ChatState, command):
+        """
+          Answer show more, sort by and only direct flights from the offers
+          of the last search, without searching again while the offer cache
+          of the worker serving the turn has them
+        """
+        if flight_search.flexible_dates:
+            await turn_context.send_activity(MessageFactory.text(FLEXIBLE_BROWSE_MESSAGE))
+            return
+        params = self._create_flight_offers_params(flight_search)
+        browsing = chat_state.offer_browsing
+        if browsing is None or browsing.search != self._offer_search(params):
+            # no offers were shown for this search yet
+            await self._send_flight_offers(turn_context, flight_search, chat_state)
+            return
+        offers = await self._get_flight_offers(turn_context, params)
+        if offers is None:
+            return
+        url = self._create_flight_search_url(flight_search)
+        updated = browsing.offers != offers.fingerprint()
+        if updated:
+            # the offers were searched again since the rows were saved,
+            # they would point at other offers: start over from the top
+            view = OfferView(offers, url, by=browsing.by, direct=browsing.direct)
         else:
-            flights = res.json()["data"]["itineraries"]
-            if flights:
+            view = OfferView(offers, url, browsing.shown, browsing.by, browsing.direct,
+                             browsing.cursor)
+        if command in SORT_COMMANDS:
+            view.sort_by(SORT_COMMANDS[command])
+        elif command == DIRECT_FLIGHTS_COMMAND:
+            view.only_direct()
+        rows = view.next_page(MORE_OFFERS)
+        chat_state.offer_browsing = self._offer_browsing(params, view)
+        if not rows:
+            await turn_context.send_activity(MessageFactory.text(
+                "There are no direct flights for this search" if view.direct and not len(view)
+                else NO_MORE_FLIGHTS_MESSAGE))
+            return
+        await self._send_offer_page(
+            turn_context, view, rows,
+            f"{UPDATED_FLIGHTS_MESSAGE if updated else ''}"
+            f"{'Direct flights' if view.direct else 'Flights'} by {view.by}, "
+            f"{len(view)} in total")
+
+    async def _get_flight_offers(self, turn_context: TurnContext, params,
+                                 on_first_batch=None, shown=()):
+        """
+          The offers of the search, from the offer cache while it has them.
+          None once the user has been told that there are none.
+        """
+        try:
+            offers = await self.offer_cache.get_or_load(
+                self._offer_cache_key(params),
+                lambda: self._fetch_flight_offers(params, on_first_batch),
+                cacheable=bool,
+                refresh=lambda: self._fetch_flight_offers(params))
+        except UpstreamUnavailableError as error:
+            print(f"\n [flight search] not sent: {error}", file=sys.stderr)
+            await turn_context.send_activity(
+                MessageFactory.text(FLIGHTS_UNAVAILABLE_MESSAGE))
+            return None
+        except (ClientError, asyncio.TimeoutError, AuthenticationError, ValueError, KeyError) as error:
+            print(f"\n [flight search] failed: {error!r}", file=sys.stderr)
+            if not shown:
+                await turn_context.send_activity(
+                    MessageFactory.text(FLIGHTS_NOT_FOUND_MESSAGE))
+            return None
+
+        if not offers:
+            await turn_context.send_activity(
+                MessageFactory.text(FLIGHTS_NOT_FOUND_MESSAGE))
+            return None
+        return offers
+
+    def _offer_browsing(self, params, view: OfferView) -> OfferBrowsing:
+        return OfferBrowsing(self._offer_search(params), view.store.fingerprint(), view.by,
+                             view.direct, view.cursor, view.shown)
+
+    async def _send_offer_page(self, turn_context: TurnContext, view: OfferView, rows, text):
+        message = MessageFactory.carousel(
+            [self._create_flight_offer_card(None, view.store.offer(row), view.url)
+             for row in rows],
+            text)
+        message.suggested_actions = self.browse_actions
+        await turn_context.send_activity(message)
+
+    async def _send_flexible_dates_prices(self, turn_context: TurnContext, flight_search):
+        """ Search every pair of dates around the chosen ones and send the cheapest price of each """
+        today = date.today()
+        shifts = range(-FLEXIBLE_DAYS, FLEXIBLE_DAYS + 1)
+        travel_date = datetime.strptime(flight_search.travel_date, "%Y-%m-%d").date()
+        travel_dates = [travel_date + timedelta(days=shift) for shift in shifts
+                        if travel_date + timedelta(days=shift) >= today]
+        return_dates = [None]
+        if flight_search.return_trip and flight_search.return_date:
+            return_date = datetime.strptime(flight_search.return_date, "%Y-%m-%d").date()
+            return_dates = [return_date + timedelta(days=shift) for shift in shifts]
+
+        base_params = self._create_flight_offers_params(flight_search)
+        base_params['max'] = FLEXIBLE_OFFERS_PER_SEARCH
+        pairs = []
+        searches = []
+        for departure in travel_dates:
+            for arrival in return_dates:
+                if arrival is not None and arrival < departure:
+                    continue
+                params = dict(base_params, departureDate=departure.isoformat())
+                if arrival is not None:
+                    params['returnDate'] = arrival.isoformat()
+                pairs.append((departure, arrival))
+                searches.append(params)
+
+        results = await self.fan_out.map(
+            self._find_cheapest_offer, searches, deadline=FLEXIBLE_SEARCH_DEADLINE)
+        cheapest = {}
+        for pair, result in zip(pairs, results):
+            if isinstance(result, BaseException):
+                print(f"\n [flexible search] {pair[0]} {pair[1]} failed: {result!r}", file=sys.stderr)
+            elif result is not None:
+                cheapest[pair] = result
+        if not cheapest:
+            unavailable = any(isinstance(result, UpstreamUnavailableError) for result in results)
+            await turn_context.send_activity(MessageFactory.text(
+                FLIGHTS_UNAVAILABLE_MESSAGE if unavailable else FLIGHTS_NOT_FOUND_MESSAGE))
+            return
+
+        best_pair = min(cheapest, key=lambda pair: cheapest[pair].price)
+        rows = []
+        for departure in travel_dates:
+            cells = []
+            for arrival in return_dates:
+                offer = cheapest.get((departure, arrival))
+                cells.append(f"{offer.price:,.0f}" if offer else "-")
+            rows.append((departure.strftime("%a %d %b"), cells))
+        headers = [arrival.strftime("%a %d %b") if arrival else "One way"
+                   for arrival in return_dates]
+        best = cheapest[best_pair]
+        await turn_context.send_activity(MessageFactory.attachment(CardFactory.adaptive_card(
+            CustomAdaptiveCard.create_price_matrix_card(
+                f"Cheapest flights ±{FLEXIBLE_DAYS} days",
+                f"Prices in {best.currency}, departure dates down and return dates across",
+                headers, rows,
+                (travel_dates.index(best_pair[0]), return_dates.index(best_pair[1]))))))
+
+    async def _find_cheapest_offer(self, params):
+        offers = await self.offer_cache.get_or_load(
+            self._offer_cache_key(params),
+            lambda: self._fetch_flight_offers(params),
+            cacheable=bool)
+        return offers.offer(offers.sort()[0]) if offers else None
+
+    def _prefetch_flight_offers(self, turn_context: TurnContext, flight_search):
+        """
+          Search in the background for the offers of the most common cabin
+          class and passengers as soon as the dates are known, so that they
+          are cached by the time the profile is complete
+        """
+        if flight_search.flexible_dates:
+            return
+        params = self._create_flight_offers_params(FlightSearch(
+            origin=flight_search.origin, destination=flight_search.destination,
+            travel_date=flight_search.travel_date, return_date=flight_search.return_date,
+            return_trip=flight_search.return_trip, cabin_class=PREFETCH_CABIN_CLASS,
+            **PREFETCH_PASSENGERS))
+        key = self._offer_cache_key(params)
+        if key not in self.offer_cache:
+            self.prefetcher.start(
+                turn_context.activity.conversation.id, key, self._prefetch, key, params)
+
+    async def _prefetch(self, key, params):
+        # speculative searches only use spare upstream capacity, they are
+        # shed rather than queued behind the searches users wait for
+        await self.offer_cache.get_or_load(
+            key,
+            lambda: self._fetch_flight_offers(params, deadline=time.monotonic()),
+            cacheable=bool)
+
+    def _offer_cache_key(self, params):
+        return tuple(sorted(params.items()))
+
+    def _offer_search(self, params) -> str:
+        """ The offer cache key of the search as kept in the state """
+        return urlencode(self._offer_cache_key(params))
+
+    async def _send_top_offers(self, turn_context: TurnContext, offers: OfferStore, url):
+        """ Send the top offers and return their rows """
+        ranked = offers.top(TOP_OFFERS)
+        await turn_context.send_activity(MessageFactory.carousel(
+            [self._create_flight_offer_card(label, offers.offer(row), url)
+             for label, row in ranked]))
+        return [row for _, row in ranked]
+
+    @timed("operation_seconds", "card_building")
+    def _create_flight_offer_card(self, label, offer: FlightOffer, url):
+        price = f"{offer.currency} {offer.price:,.2f}"
+        stops = "Direct" if offer.stops == 0 else \
+            f"{offer.stops} stop{'s' if offer.stops > 1 else ''}"
+        legs = [f"{leg.origin} {leg.departure_at[11:16]} - {leg.destination} "
+                f"{leg.arrival_at[11:16]} ({', '.join(leg.flights)})"
+                for leg in offer.legs]
+        return self.flight_offer_card_template.attachment({
+            "title": f"{label}: {price}" if label else price,
+            "subtitle": f"{format_duration(offer.duration)}, {stops}",
+            "text": "\n\n".join(legs),
+            "url": url,
+        })
+
+    @timed("operation_seconds", "airport_search")
+    async def _search_airports_by_location(self, airport):
+        if self.airport_index is not None:
+            airports = self.airport_index.suggest(airport, 11)
+            if airports:
                 return ValidationResult(
                     is_valid=True,
-                    value=flights,
+                    value=airports,
                 )
-            else:
+            if not self.airport_remote_fallback:
                 return ValidationResult(
                     is_valid=False,
-                    message="I'm sorry, we couldn't retrieve flights for you, please retry the process",
+                    message=AIRPORT_NOT_FOUND_MESSAGE,
                 )
 
-    def _search_airports_by_location(self, airport):
-        res_obj = self.http_service.post(AIRPORT_SEARCH_API, {"term": airport})
-        res = res_obj.json()
-        if res["statusCode"] == 200 and len(res["airports"]) > 0:
+        term = " ".join(airport.lower().split())
+        return await AIRPORT_SEARCH_CACHE.get_or_load(
+            term,
+            lambda: self._fetch_airports_by_location(term),
+            cacheable=lambda result: result.is_valid)
+
+    async def _fetch_airports_by_location(self, airport):
+        try:
+            res_obj = await self.airport_codes_guard.call(
+                self.airport_codes_http_service.post, AIRPORT_SEARCH_API, {"term": airport})
+            res = res_obj.json() if res_obj.status_code == 200 else None
+        except (UpstreamUnavailableError, ClientError, asyncio.TimeoutError, ValueError) as error:
+            print(f"\n [airport search] failed: {error!r}", file=sys.stderr)
+            res = None
+        if not isinstance(res, dict):
+            return ValidationResult(
+                is_valid=False,
+                message=AIRPORT_SEARCH_UNAVAILABLE_MESSAGE,
+            )
+        if res.get("statusCode") == 200 and res.get("airports"):
+            for airport in res["airports"]:
+                self.airport_suggestions.add(airport)
             return ValidationResult(
                 is_valid=True,
                 value=res["airports"][:11],
@@ -768,9 +1230,7 @@ class FlightSearchBot(ActivityHandler):
         else:
             return ValidationResult(
                 is_valid=False,
-                message="""I'm sorry, we couldn't retrieve that airport, 
-                maybe the keyword was ambigous or no airport has such a keyword. 
-                Please enter a different name""",
+                message=AIRPORT_NOT_FOUND_MESSAGE,
             )
 
     def _validate_return_trip_value(self, value):
@@ -795,9 +1255,7 @@ class FlightSearchBot(ActivityHandler):
         else:
             return ValidationResult(
                 is_valid=False,
-                message="""I'm sorry, we couldn't retrieve that airport, 
-                maybe the keyword was ambigous or no airport has such a keyword. 
-                Please enter a different name""",
+                message=AIRPORT_NOT_FOUND_MESSAGE,
             )
 
     def _validate_cabin_class(self, user_input):
@@ -813,17 +1271,14 @@ class FlightSearchBot(ActivityHandler):
             )
 
     def _create_number_of_passengers_card(self):
-        return CardFactory.adaptive_card(
-            CustomAdaptiveCard.create_number_of_passengers_card()
-        )
+        return self.number_of_passengers_card
 
+    @timed("operation_seconds", "card_building")
     def _create_flight_summary(self, flight_search):
-        flight_search_results_url = self._create_flight_search_url(
-            flight_search)
-        return CardFactory.adaptive_card(
-            CustomAdaptiveCard.create_flight_summary_adaptive_card(
-                flight_search.__dict__, flight_search_results_url)
-        )
+        values = flight_search.to_dict()
+        values["return_trip"] = "Yes" if flight_search.return_trip else "No"
+        values["url"] = self._create_flight_search_url(flight_search)
+        return FLIGHT_SUMMARY_TEMPLATE.attachment(values)
 
     def _create_hero_card(self) -> Attachment:
         card = HeroCard(
@@ -843,6 +1298,20 @@ class FlightSearchBot(ActivityHandler):
         )
         return CardFactory.hero_card(card)
 
+    def _validate_airport_choice(self, flow: ConversationFlow, user_input):
+        """Ensures that the airport is one of the choices offered in this conversation"""
+        city = flow.airport_choices.get(user_input)
+        if city is not None:
+            return ValidationResult(
+                is_valid=True,
+                value=city,
+            )
+        else:
+            return ValidationResult(
+                is_valid=False,
+                message="Please choose one of the airports from the options above",
+            )
+
     def _validate_origin(self, origin, destination):
         """Ensures that origin and destination are not the same"""
         if origin != destination:
@@ -857,36 +1326,41 @@ class FlightSearchBot(ActivityHandler):
                         Please enter which airport will you be departing from?""",
             )
 
-    def _validate_date(self, user_input: str) -> ValidationResult:
+    async def _validate_flexible_date(self, user_input: str):
+        """ Validate a date answer and tell whether it asks for flexible dates, e.g. "friday ±3" """
+        text, flexible = split_flexible(user_input)
+        return await self._validate_date(text), flexible
+
+    @timed("operation_seconds", "date_validation")
+    async def _validate_date(self, user_input: str) -> ValidationResult:
         try:
             # Try to recognize the input as a date-time. This works for responses such as "11/14/2018", "9pm",
-            # "tomorrow", "Sunday at 5pm", and so on. The recognizer returns a list of potential recognition results,
+            # "tomorrow", "Sunday at 5pm", and so on. The date parser returns a list of potential resolutions,
             # if any.
-            results = recognize_datetime(user_input, Culture.English)
-            for result in results:
-                for resolution in result.resolution["values"]:
-                    if "value" in resolution:
-                        now = datetime.now()
-
-                        value = resolution["value"]
-                        if resolution["type"] == "date":
-                            candidate = datetime.strptime(value, "%Y-%m-%d")
-                        elif resolution["type"] == "time":
-                            candidate = datetime.strptime(value, "%H:%M:%S")
-                            candidate = candidate.replace(
-                                year=now.year, month=now.month, day=now.day
-                            )
-                        else:
-                            candidate = datetime.strptime(
-                                value, "%Y-%m-%d %H:%M:%S")
-
-                        # user response must be more than an hour out
-                        diff = candidate - now
-                        if diff.total_seconds() >= 3600:
-                            return ValidationResult(
-                                is_valid=True,
-                                value=candidate.strftime("%Y-%m-%d"),
-                            )
+            resolutions = await self.date_parser.resolve(user_input)
+            for resolution in resolutions:
+                if "value" in resolution:
+                    now = datetime.now()
+
+                    value = resolution["value"]
+                    if resolution["type"] == "date":
+                        candidate = datetime.strptime(value, "%Y-%m-%d")
+                    elif resolution["type"] == "time":
+                        candidate = datetime.strptime(value, "%H:%M:%S")
+                        candidate = candidate.replace(
+                            year=now.year, month=now.month, day=now.day
+                        )
+                    else:
+                        candidate = datetime.strptime(
+                            value, "%Y-%m-%d %H:%M:%S")
+
+                    # user response must be more than an hour out
+                    diff = candidate - now
+                    if diff.total_seconds() >= 3600:
+                        return ValidationResult(
+                            is_valid=True,
+                            value=candidate.strftime("%Y-%m-%d"),
+                        )
 
             return ValidationResult(
                 is_valid=False,
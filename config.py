@@ -8,6 +8,77 @@ import os
 class DefaultConfig:
     """ Bot Configuration """
 
-    PORT = 3978
+    HOST = os.environ.get("Host", "localhost")
+    PORT = int(os.environ.get("Port", 3978))
     APP_ID = os.environ.get("MicrosoftAppId", "")
     APP_PASSWORD = os.environ.get("MicrosoftAppPassword", "")
+
+    # Local IATA dataset used for offline airport lookups, e.g. data/airports.csv.
+    # The remote air-port-codes API is only used for misses when the fallback
+    # is enabled.
+    AIRPORT_INDEX_PATH = os.environ.get("AirportIndexPath", "")
+    AIRPORT_REMOTE_FALLBACK = os.environ.get(
+        "AirportRemoteFallback", "true").lower() == "true"
+
+    # Conversation and user state storage: memory, sqlite or redis.
+    # StateStorageUrl is the sqlite file path or the redis://host:port/db url.
+    STATE_STORAGE = os.environ.get("StateStorage", "memory")
+    STATE_STORAGE_URL = os.environ.get("StateStorageUrl", "bot_state.sqlite3")
+    # Seconds after which idle conversations expire from the store
+    STATE_TTL = int(os.environ.get("StateTtl", 7 * 24 * 60 * 60))
+
+    # Processes running the full date recognizer for answers the fast path
+    # cannot parse, 0 runs it inline on the event loop
+    DATE_PARSER_PROCESSES = int(os.environ.get("DateParserProcesses", 1))
+
+    # Compile the date recognizer models at startup instead of on the
+    # first date answer
+    WARM_UP_RECOGNIZERS = os.environ.get(
+        "WarmUpRecognizers", "true").lower() == "true"
+
+    # Flight offer results are served for OfferCacheFreshSeconds, then
+    # served stale and refreshed in the background for up to
+    # OfferCacheStaleSeconds more. OfferCacheMaxBytes bounds the cache size.
+    OFFER_CACHE_FRESH_SECONDS = int(os.environ.get("OfferCacheFreshSeconds", 300))
+    OFFER_CACHE_STALE_SECONDS = int(os.environ.get("OfferCacheStaleSeconds", 900))
+    OFFER_CACHE_MAX_BYTES = int(os.environ.get("OfferCacheMaxBytes", 64 * 1024 * 1024))
+
+    # Upstream searches a flexible dates search runs at once, shared by all
+    # conversations, and the seconds each of them may take
+    FAN_OUT_CONCURRENCY = int(os.environ.get("FanOutConcurrency", 8))
+    FAN_OUT_TIMEOUT = float(os.environ.get("FanOutTimeoutSeconds", 8))
+
+    # Calls per second, and bursts, allowed to each upstream API. Calls over
+    # the limit queue for up to UpstreamMaxWaitSeconds and are shed when
+    # their turn would come later. After UpstreamFailureThreshold failures
+    # in a row an upstream is not called for UpstreamResetSeconds.
+    AMADEUS_RATE_LIMIT = float(os.environ.get("AmadeusRateLimit", 10))
+    AMADEUS_BURST = int(os.environ.get("AmadeusBurst", 10))
+    AIRPORT_CODES_RATE_LIMIT = float(os.environ.get("AirportCodesRateLimit", 5))
+    AIRPORT_CODES_BURST = int(os.environ.get("AirportCodesBurst", 5))
+    UPSTREAM_MAX_WAIT = float(os.environ.get("UpstreamMaxWaitSeconds", 5))
+    UPSTREAM_FAILURE_THRESHOLD = int(os.environ.get("UpstreamFailureThreshold", 5))
+    UPSTREAM_RESET_SECONDS = float(os.environ.get("UpstreamResetSeconds", 30))
+
+    # Speculative offer searches running at once, 0 turns prefetching off
+    PREFETCH_MAX_TASKS = int(os.environ.get("PrefetchMaxTasks", 20))
+
+    # server.py: worker processes sharing the listening socket, requests a
+    # worker serves before it is replaced (0 never replaces it) and seconds
+    # in-flight requests get to finish on shutdown
+    WORKERS = int(os.environ.get("Workers", os.cpu_count() or 1))
+    WORKER_MAX_REQUESTS = int(os.environ.get("WorkerMaxRequests", 0))
+    SHUTDOWN_TIMEOUT = float(os.environ.get("ShutdownTimeoutSeconds", 30))
+
+    # Seconds between event loop lag measurements, 0 turns them off
+    LOOP_LAG_INTERVAL = float(os.environ.get("LoopLagIntervalSeconds", 0.5))
+
+    # Report the stack of the event loop when it is blocked for longer than
+    # this many seconds, 0 turns the watchdog off
+    LOOP_WATCHDOG_SECONDS = float(os.environ.get("LoopWatchdogSeconds", 0))
+    # Directory receiving cProfile profiles of the sampled turns slower than
+    # ProfileSlowTurnSeconds, empty turns profiling off
+    PROFILE_DIR = os.environ.get("ProfileDir", "")
+    PROFILE_SAMPLE_RATE = float(os.environ.get("ProfileSampleRate", 0.01))
+    PROFILE_SLOW_TURN_SECONDS = float(os.environ.get("ProfileSlowTurnSeconds", 1))
+    PROFILE_MAX_FILES = int(os.environ.get("ProfileMaxFiles", 100))
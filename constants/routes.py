@@ -1,4 +1,11 @@
-AIRPORT_SEARCH_API = "https://www.air-port-codes.com/api/v1/multi"
-AMADEUS_BASE_AUTHENTICATION_API = "https://test.api.amadeus.com/v1/security/oauth2/token"
-FLIGHT_OFFERS_API = "https://test.api.amadeus.com/v2/shopping/flight-offers"
+import os
+
+# The upstream APIs can be pointed elsewhere, e.g. at the stub servers of
+# benchmarks/load_test.py
+AIRPORT_SEARCH_API = os.environ.get(
+    "AirportSearchApi", "https://www.air-port-codes.com/api/v1/multi")
+AMADEUS_BASE_AUTHENTICATION_API = os.environ.get(
+    "AmadeusAuthenticationApi", "https://test.api.amadeus.com/v1/security/oauth2/token")
+FLIGHT_OFFERS_API = os.environ.get(
+    "FlightOffersApi", "https://test.api.amadeus.com/v2/shopping/flight-offers")
 FLIGHT_SEARCH_BASE_URL = "https://www.amadeus.net/results"
@@ -0,0 +1 @@
+from .activity_buffer import ActivityBuffer, flush_activities, merge_activities
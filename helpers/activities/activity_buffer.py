@@ -0,0 +1,77 @@
+from botbuilder.core import TurnContext
+from botbuilder.schema import ActivityTypes
+
+# turn_state key of the buffer of a turn
+ACTIVITY_BUFFER_KEY = "ActivityBuffer"
+
+
+def _is_text_only(activity) -> bool:
+    return (activity.type == ActivityTypes.message and bool(activity.text)
+            and not activity.attachments and not activity.suggested_actions)
+
+
+def _is_attachments_only(activity) -> bool:
+    return (activity.type == ActivityTypes.message and not activity.text
+            and not activity.speak and bool(activity.attachments))
+
+
+def merge_activities(activities: list) -> list:
+    """
+      The activities with every text message followed by an attachments
+      message sent as one message holding both
+    """
+    merged = []
+    for activity in activities:
+        previous = merged[-1] if merged else None
+        if previous is not None and _is_text_only(previous) and _is_attachments_only(activity):
+            previous.attachments = activity.attachments
+            previous.attachment_layout = activity.attachment_layout
+            previous.suggested_actions = activity.suggested_actions
+            previous.input_hint = activity.input_hint
+            continue
+        merged.append(activity)
+    return merged
+
+
+class ActivityBuffer:
+    """
+      Holds the activities sent during a turn and posts them when the turn
+      ends, or when flush is called before a slow step.
+
+      The Bot Connector has no batch endpoint, every activity is its own
+      POST. Buffering lets a text message and the card that follows it go
+      out as one activity. Activities keep their order.
+    """
+
+    def __init__(self, turn_context: TurnContext):
+        self.turn_context = turn_context
+        self.pending = []
+        self.closed = False
+        turn_context.turn_state[ACTIVITY_BUFFER_KEY] = self
+        turn_context.on_send_activities(self._on_send_activities)
+
+    async def flush(self):
+        if not self.pending:
+            return
+        activities = merge_activities(self.pending)
+        self.pending = []
+        await self.turn_context.adapter.send_activities(self.turn_context, activities)
+
+    async def close(self):
+        """ Post what is left, activities sent afterwards are posted right away """
+        self.closed = True
+        await self.flush()
+
+    async def _on_send_activities(self, turn_context: TurnContext, activities, next_send):
+        if not self.closed:
+            # the handlers run before the send, emptying the list sends nothing
+            self.pending.extend(activities)
+            activities.clear()
+        await next_send()
+
+
+async def flush_activities(turn_context: TurnContext):
+    """ Post the activities buffered so far in the turn, if any """
+    buffer = turn_context.turn_state.get(ACTIVITY_BUFFER_KEY)
+    if buffer is not None:
+        await buffer.flush()
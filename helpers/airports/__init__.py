@@ -0,0 +1 @@
+from .airport_index import AirportIndex
@@ -0,0 +1,192 @@
+import csv
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from helpers.caching import TTLCache
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# score contributed by a query token depending on how it matched
+EXACT_MATCH = 4
+PREFIX_MATCH = 2
+FUZZY_MATCH = 1
+IATA_MATCH = 20
+CITY_BONUS = 1
+
+# shortest query token that is matched with typo tolerance
+FUZZY_MIN_LENGTH = 4
+
+# seconds a typeahead suggestion is reused, changes in popularity show up
+# after at most this long
+SUGGESTION_TTL = 60
+
+
+def normalise(text: str) -> str:
+    """ Lower case the text and strip accents and punctuation """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(TOKEN_PATTERN.findall(text.lower()))
+
+
+def _deletes(token: str) -> set:
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+class AirportIndex:
+    """
+      In-memory airport index over a local IATA dataset.
+
+      Supports IATA code, prefix, token and typo tolerant matching on the
+      airport name and city. Results have the same {"iata", "name", "city"}
+      shape as the air-port-codes API. Airports can be added as they are
+      seen and equally good matches are ranked by how often users chose
+      them.
+    """
+
+    def __init__(self, airports=None):
+        self.airports = []
+        self._iata = {}
+        # sorted (token, airport position) pairs used for prefix lookups
+        self._tokens = []
+        self._city_tokens = []
+        # single deletion neighbourhood of every token, for typo tolerance
+        self._deletes = defaultdict(set)
+        # times each airport was chosen by a user
+        self._popularity = []
+        self.suggestions = TTLCache(max_size=10000, ttl=SUGGESTION_TTL)
+        for airport in airports or []:
+            self._tokens.extend(self._add(airport))
+        self._tokens.sort()
+
+    def __len__(self):
+        return len(self.airports)
+
+    @classmethod
+    def from_csv(cls, path: str):
+        """ Load a dataset with iata, name and city columns """
+        with open(path, newline="", encoding="utf-8") as dataset:
+            rows = csv.DictReader(dataset)
+            return cls(
+                {"iata": row["iata"].strip().upper(),
+                 "name": row["name"].strip(),
+                 "city": row["city"].strip()}
+                for row in rows if len(row.get("iata") or "") == 3
+            )
+
+    def add(self, airport) -> bool:
+        """ Index an airport seen at runtime, returns False if it is known already """
+        if not airport.get("iata") or airport["iata"].upper() in self._iata:
+            return False
+        airport = {"iata": airport["iata"].upper(),
+                   "name": airport.get("name") or airport["iata"].upper(),
+                   "city": airport.get("city") or ""}
+        for entry in self._add(airport):
+            insort(self._tokens, entry)
+        self.suggestions.clear()
+        return True
+
+    def record_choice(self, iata: str):
+        """ Count a user choosing the airport, popular airports rank first """
+        position = self._iata.get((iata or "").upper())
+        if position is not None:
+            self._popularity[position] += 1
+
+    def popularity(self, iata: str) -> int:
+        position = self._iata.get((iata or "").upper())
+        return 0 if position is None else self._popularity[position]
+
+    def get(self, iata: str):
+        position = self._iata.get((iata or "").upper())
+        return None if position is None else self.airports[position]
+
+    def search(self, term: str, limit: int = 11):
+        """ Return the best matching airports for the search term """
+        query = normalise(term).split()
+        if not query:
+            return []
+
+        scores = defaultdict(int)
+        if len(query) == 1 and len(query[0]) == 3:
+            position = self._iata.get(query[0].upper())
+            if position is not None:
+                scores[position] += IATA_MATCH
+
+        # every query token has to match the airport for it to be returned
+        matched = None
+        for token in query:
+            token_scores = self._match_token(token)
+            if matched is None:
+                matched = set(token_scores)
+            else:
+                matched &= set(token_scores)
+            for position, score in token_scores.items():
+                scores[position] += score
+
+        candidates = matched or set()
+        candidates.update(p for p, s in scores.items() if s >= IATA_MATCH)
+        popularity = self._popularity
+        ranked = sorted(
+            candidates,
+            key=lambda p: (-scores[p], -popularity[p], self.airports[p]["name"]))
+        return [self.airports[p] for p in ranked[:limit]]
+
+    def suggest(self, term: str, limit: int = 8):
+        """
+          Typeahead suggestions for a partial input such as "nai". Repeated
+          prefixes are answered from a short lived cache.
+        """
+        key = (normalise(term), limit)
+        suggestions = self.suggestions.get(key)
+        if suggestions is None:
+            suggestions = self.search(key[0], limit)
+            self.suggestions.set(key, suggestions)
+        return suggestions
+
+    def _add(self, airport) -> list:
+        """ Register the airport and return its (token, position) entries """
+        position = len(self.airports)
+        self.airports.append(airport)
+        self._popularity.append(0)
+        self._iata[airport["iata"]] = position
+        city_tokens = set(normalise(airport["city"]).split())
+        self._city_tokens.append(city_tokens)
+        tokens = city_tokens | set(normalise(airport["name"]).split())
+        tokens.add(airport["iata"].lower())
+        for token in tokens:
+            if len(token) >= FUZZY_MIN_LENGTH - 1:
+                for deleted in _deletes(token) | {token}:
+                    self._deletes[deleted].add(token)
+        return [(token, position) for token in tokens]
+
+    def _match_token(self, token: str) -> dict:
+        scores = {}
+        for candidate, position in self._scan(token):
+            if not candidate.startswith(token):
+                break
+            score = EXACT_MATCH if candidate == token else PREFIX_MATCH
+            if token in self._city_tokens[position]:
+                score += CITY_BONUS
+            scores[position] = max(score, scores.get(position, 0))
+
+        if not scores and len(token) >= FUZZY_MIN_LENGTH:
+            for candidate in self._fuzzy_tokens(token):
+                for indexed, position in self._scan(candidate):
+                    if indexed != candidate:
+                        break
+                    scores[position] = FUZZY_MATCH
+        return scores
+
+    def _scan(self, token: str):
+        """ Iterate over the sorted tokens starting at the first one >= token """
+        tokens = self._tokens
+        for index in range(bisect_left(tokens, (token, -1)), len(tokens)):
+            yield tokens[index]
+
+    def _fuzzy_tokens(self, token: str) -> set:
+        """ Indexed tokens within a single insertion, deletion, substitution or transposition """
+        candidates = set(self._deletes.get(token, ()))
+        for deleted in _deletes(token):
+            candidates.update(self._deletes.get(deleted, ()))
+        return candidates
@@ -1 +1 @@
-from .authentication import Authenticate
+from .authentication import Authenticate, AuthenticationError
@@ -1,25 +1,133 @@
-""" Handles Wolfnet API Authenication """
+""" Handles Amadeus API Authenication """
+import asyncio
 import os
+import sys
+import time
 
 from helpers.services import HttpService
 from constants import AMADEUS_BASE_AUTHENTICATION_API
 
 
+class AuthenticationError(Exception):
+    """ Raised when an access token could not be obtained """
+
+
 class Authenticate:
-    """ Handle wolfnet API Authentication """
+    """
+      Handle Amadeus API Authentication
+
+      Tracks the expiry of the client-credentials token and refreshes it in
+      the background before it runs out. Concurrent refreshes share a single
+      upstream request and requests rejected with a 401 are retried once with
+      a fresh token.
+    """
 
-    def __init__(self):
+    def __init__(self, refresh_margin: float = 120, retry_delay: float = 5):
         self.http_service = HttpService()
+        # refresh the token this many seconds before it expires
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
+        self.access_token = None
+        self.expires_at = 0
+        self._login_future = None
+        self._refresh_task = None
 
-    def login(self):
+    @property
+    def is_logged_in(self):
+        return self.access_token is not None and time.monotonic() < self.expires_at
+
+    async def login(self):
         """ Log in by setting api_token header in the http_service object """
-        res = self.http_service.post(AMADEUS_BASE_AUTHENTICATION_API, {
-            'client_id': os.environ['AMADEUS_API_KEY'], 'client_secret': os.environ['AMADEUS_API_SECRET'],
-            'grant_type': 'client_credentials'})
-        self.http_service.config_service(
-            {'Authorization': f"Bearer {res.json()['access_token']}"})
+        if self._login_future is None:
+            self._login_future = asyncio.ensure_future(self._request_token())
+            self._login_future.add_done_callback(self._clear_login_future)
+        await asyncio.shield(self._login_future)
+
+    async def ensure_token(self):
+        """ Log in unless a valid token is already held """
+        if not self.is_logged_in:
+            await self.login()
+
+    async def get(self, url, params=None):
+        """ Authenticated GET, retried once with a new token on a 401 """
+        return await self._authorized(self.http_service.get, url, params)
+
+    async def post(self, url, data=None):
+        """ Authenticated POST, retried once with a new token on a 401 """
+        return await self._authorized(self.http_service.post, url, data)
+
+    async def stream_get(self, url, params=None):
+        """ Authenticated GET returning a StreamedResponse, retried once with a new token on a 401 """
+        return await self._authorized(self._stream_get, url, params)
 
     def logout(self):
         """ Log out by setting api_token header in the http_service object to None"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        self.access_token = None
+        self.expires_at = 0
         self.http_service.config_service(
             {'Authorization': None})
+
+    async def close(self):
+        self.logout()
+        await self.http_service.close()
+
+    async def _authorized(self, send, url, payload):
+        await self.ensure_token()
+        token = self.access_token
+        res = await send(url, payload)
+        if res.status_code == 401:
+            res.release()
+            # only refresh if no other request has done so in the meantime
+            if token == self.access_token:
+                self.expires_at = 0
+            await self.ensure_token()
+            res = await send(url, payload)
+        return res
+
+    def _stream_get(self, url, params):
+        return self.http_service.stream("GET", url, params=params or {})
+
+    async def _request_token(self):
+        res = await self.http_service.post(AMADEUS_BASE_AUTHENTICATION_API, {
+            'client_id': os.environ['AMADEUS_API_KEY'], 'client_secret': os.environ['AMADEUS_API_SECRET'],
+            'grant_type': 'client_credentials'})
+        if res.status_code != 200:
+            raise AuthenticationError(
+                f"Amadeus authentication failed with status {res.status_code}")
+        body = res.json()
+        expires_in = float(body.get('expires_in', 1799))
+        self.access_token = body['access_token']
+        self.expires_at = time.monotonic() + expires_in
+        self.http_service.config_service(
+            {'Authorization': f"Bearer {self.access_token}"})
+        self._schedule_refresh(max(expires_in - self.refresh_margin, 0))
+
+    def _clear_login_future(self, future):
+        self._login_future = None
+        if not future.cancelled():
+            # retrieved by the waiters, if any
+            future.exception()
+
+    def _schedule_refresh(self, delay):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        self._refresh_task = asyncio.ensure_future(self._refresh_later(delay))
+
+    async def _refresh_later(self, delay):
+        await asyncio.sleep(delay)
+        while True:
+            try:
+                await self.login()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                print(f"\n [token refresh] failed: {error}", file=sys.stderr)
+                if not self.is_logged_in:
+                    # the next request will log in again on demand
+                    return
+                await asyncio.sleep(self.retry_delay)
+
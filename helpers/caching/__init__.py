@@ -0,0 +1,3 @@
+from .ttl_cache import TTLCache
+from .result_cache import ResultCache
+from .shared_load import SharedLoad
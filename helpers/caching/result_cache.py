@@ -0,0 +1,156 @@
+import sys
+import time
+from collections import OrderedDict
+from functools import partial
+
+from .shared_load import SharedLoad
+
+
+class ResultCache:
+    """
+      Cache of upstream results bounded by their approximate size in bytes.
+
+      Entries are fresh for fresh_ttl seconds and then served stale for up
+      to stale_ttl more seconds while a single background load revalidates
+      them. Concurrent misses of the same key share one load, which runs in
+      its own task so that a cancelled caller does not cancel it for the
+      others.
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20, fresh_ttl: float = 300,
+                 stale_ttl: float = 900, sizeof=sys.getsizeof):
+        self.max_bytes = max_bytes
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.loads = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """ Whether a fresh value, or a load, is there for key """
+        entry = self._entries.get(key)
+        return self._loading(key) or (entry is not None and entry[0] > time.monotonic())
+
+    @property
+    def requests(self) -> int:
+        return self.hits + self.stale_hits + self.misses + self.coalesced
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.requests
+        return (self.hits + self.stale_hits) / requests if requests else 0.0
+
+    @property
+    def upstream_calls_saved(self) -> int:
+        return self.requests - self.loads
+
+    def set(self, key, value):
+        self._discard(key)
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        now = time.monotonic()
+        self._entries[key] = (now + self.fresh_ttl, now + self.fresh_ttl + self.stale_ttl,
+                              size, value)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, _, size, _) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._discard(key)
+        return default if entry is None else entry[3]
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    async def get_or_load(self, key, loader, cacheable=None, refresh=None):
+        """
+          Return the cached value for key, awaiting loader() on a miss.
+          Stale values are returned as is while refresh(), or loader() when
+          not given, reloads them in the background. Only values accepted by
+          cacheable (all values by default) are stored.
+        """
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and entry[1] <= now:
+            self._discard(key)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if entry[0] > now:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                if not self._loading(key):
+                    load = self._begin(key, refresh or loader, cacheable, held=True)
+                    load.task.add_done_callback(self._revalidated)
+            return entry[3]
+
+        if self._loading(key):
+            self.coalesced += 1
+            load = self._pending[key]
+        else:
+            self.misses += 1
+            load = self._begin(key, loader, cacheable)
+        return await load.wait()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "upstream_calls": self.loads,
+            "upstream_calls_saved": self.upstream_calls_saved,
+            "hit_ratio": self.hit_ratio,
+        }
+
+    def _loading(self, key) -> bool:
+        load = self._pending.get(key)
+        return load is not None and not load.abandoned
+
+    def _begin(self, key, loader, cacheable, held=False) -> SharedLoad:
+        """ Start the load of key so that other requests wait for it """
+        load = SharedLoad(self._load(key, loader, cacheable), held)
+        self._pending[key] = load
+        load.task.add_done_callback(partial(self._forget, key, load))
+        self.loads += 1
+        return load
+
+    async def _load(self, key, loader, cacheable):
+        value = await loader()
+        if cacheable is None or cacheable(value):
+            self.set(key, value)
+        return value
+
+    def _forget(self, key, load, task):
+        if self._pending.get(key) is load:
+            del self._pending[key]
+
+    @staticmethod
+    def _revalidated(task):
+        if not task.cancelled() and task.exception() is not None:
+            # the stale value is served until it expires
+            print(f"\n [cache] revalidation failed: {task.exception()}", file=sys.stderr)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+        return entry
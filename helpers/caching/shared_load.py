@@ -0,0 +1,34 @@
+import asyncio
+
+
+class SharedLoad:
+    """
+      A load running in its own task and awaited by any number of callers.
+
+      A cancelled caller only stops waiting for the load. The load itself is
+      cancelled once no caller waits for it anymore, unless it is held, e.g.
+      a background revalidation that runs whether or not anyone waits.
+    """
+
+    def __init__(self, coroutine, held: bool = False):
+        self.held = held
+        self.waiters = 0
+        self.abandoned = False
+        self.task = asyncio.ensure_future(coroutine)
+        self.task.add_done_callback(self._retrieve)
+
+    async def wait(self):
+        self.waiters += 1
+        try:
+            return await asyncio.shield(self.task)
+        finally:
+            self.waiters -= 1
+            if not self.waiters and not self.held and not self.task.done():
+                self.abandoned = True
+                self.task.cancel()
+
+    @staticmethod
+    def _retrieve(task):
+        # the waiters, if any, consume the exception
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,110 @@
+import time
+from collections import OrderedDict
+from functools import partial
+
+from .shared_load import SharedLoad
+
+
+class TTLCache:
+    """
+      Bounded in-process cache with per entry expiry and LRU eviction.
+
+      get_or_load deduplicates concurrent loads of the same key so that
+      simultaneous misses result in a single call to the loader. The load
+      runs in its own task, a cancelled caller does not cancel it for the
+      others.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key, default=None):
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_or_load(self, key, loader, cacheable=None):
+        """
+          Return the cached value for key, awaiting loader() on a miss.
+          Only values accepted by cacheable (all values by default) are stored.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+
+        load = self._pending.get(key)
+        if load is not None and not load.abandoned:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            load = SharedLoad(self._load(key, loader, cacheable))
+            self._pending[key] = load
+            load.task.add_done_callback(partial(self._forget, key, load))
+        return await load.wait()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_ratio": self.hit_ratio,
+        }
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _load(self, key, loader, cacheable):
+        value = await loader()
+        if cacheable is None or cacheable(value):
+            self.set(key, value)
+        return value
+
+    def _forget(self, key, load, task):
+        if self._pending.get(key) is load:
+            del self._pending[key]
@@ -0,0 +1 @@
+from .date_parser import DateParser, split_flexible, FLEXIBLE_DAYS
@@ -0,0 +1,162 @@
+import asyncio
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from recognizers_number import Culture
+from recognizers_date_time import recognize_datetime
+
+from helpers.caching import TTLCache
+
+ISO_DATE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+SLASH_DATE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+RELATIVE_DAYS = {
+    "today": 0,
+    "tomorrow": 1,
+    "day after tomorrow": 2,
+    "the day after tomorrow": 2,
+}
+# one phrase per kind of date extractor, compiling its models on first use
+WARM_UP_PHRASES = ["next friday", "tomorrow at 5pm", "in two weeks", "1st of december 2030"]
+# days searched either side of a flexible date
+FLEXIBLE_DAYS = 3
+# "<date> ±3", "<date> +-3", "<date> +/-3 days" or "<date> flexible", with
+# FLEXIBLE_DAYS in place of the 3
+FLEXIBLE_SUFFIX = re.compile(
+    rf"\s*(?:(?:±|\+/?-)\s*{FLEXIBLE_DAYS}(?:\s*days?)?|flexible)\s*$", re.IGNORECASE)
+# resolutions with a time of day, e.g. "in 3 hours" or "tonight", which
+# resolve differently from one hour to the next
+TIME_OF_DAY_TYPES = {"datetime", "time", "timerange", "datetimerange"}
+WEEKDAYS = {name: index for index, name in enumerate(
+    ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"])}
+
+
+def normalise(text: str) -> str:
+    return " ".join((text or "").lower().strip(" .!?").split())
+
+
+def split_flexible(text: str):
+    """ Split a date answer into the date and whether flexible dates were asked for """
+    match = FLEXIBLE_SUFFIX.search(text or "")
+    if match is None:
+        return text, False
+    return text[:match.start()], True
+
+
+def date_resolution(value: date) -> dict:
+    return {"type": "date", "value": value.isoformat()}
+
+
+def fast_resolve(phrase: str, today: date):
+    """
+      Resolve the common date formats without the recognizer. Returns the
+      resolutions in the recognizer's format, or None when the phrase needs
+      the full recognizer.
+    """
+    match = ISO_DATE.fullmatch(phrase)
+    if match:
+        year, month, day = (int(part) for part in match.groups())
+        return _resolution_or_none(year, month, day)
+
+    match = SLASH_DATE.fullmatch(phrase)
+    if match:
+        first, second, year = (int(part) for part in match.groups())
+        # month first unless that cannot be a month, as the recognizer does
+        if first <= 12:
+            return _resolution_or_none(year, first, second)
+        return _resolution_or_none(year, second, first)
+
+    if phrase in RELATIVE_DAYS:
+        return [date_resolution(today + timedelta(days=RELATIVE_DAYS[phrase]))]
+
+    weekday = WEEKDAYS.get(phrase[3:] if phrase.startswith("on ") else phrase)
+    if weekday is not None:
+        # the last such day before today and the next one from today on
+        ahead = (weekday - today.weekday()) % 7
+        return [date_resolution(today + timedelta(days=ahead - 7)),
+                date_resolution(today + timedelta(days=ahead))]
+    return None
+
+
+def _resolution_or_none(year, month, day):
+    try:
+        return [date_resolution(date(year, month, day))]
+    except ValueError:
+        return None
+
+
+def is_date_only(resolutions) -> bool:
+    return not any(resolution.get("type") in TIME_OF_DAY_TYPES for resolution in resolutions)
+
+
+def recognize_resolutions(phrase: str):
+    """ Resolutions of every date found in the phrase by the full recognizer """
+    return [resolution
+            for result in recognize_datetime(phrase, Culture.English)
+            for resolution in result.resolution["values"]]
+
+
+class DateParser:
+    """
+      Tiered date parser in front of the recognizers-text date recognizer.
+
+      Common formats are resolved by a strict fast path, date phrases
+      already seen today are served from a cache, and only the rest go to
+      the recognizer, which runs in a process pool so that it does not hold
+      the event loop. With processes set to 0 the recognizer runs inline.
+    """
+
+    def __init__(self, processes: int = 1, cache_size: int = 10000):
+        self.processes = processes
+        self.cache = TTLCache(max_size=cache_size, ttl=24 * 60 * 60)
+        self.fast_path_hits = 0
+        self._executor = None
+
+    async def resolve(self, text: str):
+        """ Resolutions for the text in the format of the recognizer """
+        phrase = normalise(text)
+        today = date.today()
+        resolutions = fast_resolve(phrase, today)
+        if resolutions is not None:
+            self.fast_path_hits += 1
+            return resolutions
+        # relative phrases resolve differently from one day to the next, and
+        # the ones with a time of day from one moment to the next
+        return await self.cache.get_or_load(
+            (phrase, today.toordinal()), lambda: self._recognize(phrase),
+            cacheable=is_date_only)
+
+    def warm_up(self) -> float:
+        """
+          Compile the recognizer models ahead of the first date answer and
+          start the process pool from the warm process, so that forked
+          workers share the compiled models. Returns the seconds taken.
+        """
+        started = time.perf_counter()
+        for phrase in WARM_UP_PHRASES:
+            recognize_resolutions(phrase)
+        if self.processes:
+            self._start_executor()
+            # fork the workers now rather than on the first cache miss
+            for future in [self._executor.submit(recognize_resolutions, phrase)
+                           for phrase in WARM_UP_PHRASES[:self.processes]]:
+                future.result()
+        return time.perf_counter() - started
+
+    def _start_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes)
+
+    async def _recognize(self, phrase: str):
+        if not self.processes:
+            return recognize_resolutions(phrase)
+        self._start_executor()
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, recognize_resolutions, phrase)
+
+    def close(self):
+        """ Stop the pool, waiting for its processes so that none outlives this one """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,10 @@
+from .metrics import (
+    MetricsRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    LoopLagMonitor,
+    timed,
+    LATENCY_BUCKETS,
+)
+from .profiling import LoopWatchdog, TurnProfiler
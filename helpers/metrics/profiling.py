@@ -0,0 +1,133 @@
+import asyncio
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+
+
+class LoopWatchdog:
+    """
+      Thread reporting the stack of the event loop thread whenever the loop
+      has not run a heartbeat for threshold seconds, i.e. while a coroutine
+      blocks it with synchronous work.
+
+      Each block is reported once, with its length once the loop is back.
+    """
+
+    def __init__(self, threshold: float = 0.5):
+        self.threshold = threshold
+        self.interval = threshold / 4
+        self.blocks = 0
+        self.longest = 0.0
+        self._loop = None
+        self._loop_thread = None
+        self._beat = time.monotonic()
+        self._reported = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Watch the running event loop, call it from a coroutine """
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_event_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {"blocks": self.blocks, "longest_seconds": round(self.longest, 3)}
+
+    def _heartbeat(self):
+        now = time.monotonic()
+        if self._reported is not None:
+            blocked = now - self._reported
+            self.longest = max(self.longest, blocked)
+            print(f"\n [watchdog] event loop was blocked for {blocked:.3f}s", file=sys.stderr)
+            self._reported = None
+        self._beat = now
+        if not self._stopped.is_set():
+            self._loop.call_later(self.interval, self._heartbeat)
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            if self._reported == beat or time.monotonic() - beat < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            self._reported = beat
+            self.blocks += 1
+            stack = "".join(traceback.format_stack(frame))
+            print(f"\n [watchdog] event loop blocked for over {self.threshold}s in:\n{stack}",
+                  file=sys.stderr)
+
+
+class TurnProfiler:
+    """
+      Profiles a sample of the turns with cProfile and keeps the profiles of
+      the ones slower than threshold seconds in directory, at most max_files
+      of them. The files load with pstats or snakeviz.
+
+      A profile covers the event loop thread, so the work of other turns
+      interleaved with the sampled one shows up in it as well. Only one turn
+      is profiled at a time per process. The directory is counted again
+      before every dump, so max_files also holds for the workers of
+      server.py sharing it.
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 0.01,
+                 threshold: float = 1.0, max_files: int = 100):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.max_files = max_files
+        self.sampled = 0
+        self.dumped = 0
+        self._active = False
+        os.makedirs(directory, exist_ok=True)
+        self._files = self._count_files()
+
+    def start(self):
+        """ A running profile if this turn is sampled, otherwise None """
+        if self._active or self._files >= self.max_files or random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is running in this thread
+            return None
+        self._active = True
+        self.sampled += 1
+        return profile
+
+    def finish(self, profile: cProfile.Profile, seconds: float, label: str):
+        profile.disable()
+        self._active = False
+        if seconds < self.threshold:
+            return
+        self._files = self._count_files()
+        if self._files >= self.max_files:
+            return
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{label}-{int(seconds * 1000)}ms.prof"
+        profile.dump_stats(os.path.join(self.directory, name))
+        self._files += 1
+        self.dumped += 1
+
+    def stats(self) -> dict:
+        return {"sampled": self.sampled, "dumped": self.dumped}
+
+    def _count_files(self) -> int:
+        return sum(1 for name in os.listdir(self.directory) if name.endswith(".prof"))
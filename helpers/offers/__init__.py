@@ -0,0 +1,4 @@
+from .offer_stream import OfferStreamParser
+from .flight_offer import FlightOffer, Leg, parse_duration, format_duration
+from .offer_store import OfferStore, offers_size
+from .offer_view import OfferView
@@ -0,0 +1,54 @@
+import re
+
+ISO_DURATION = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?")
+
+
+def parse_duration(text: str) -> int:
+    """ Minutes in an ISO 8601 duration such as PT10H30M """
+    match = ISO_DURATION.fullmatch(text or "")
+    if not match:
+        return 0
+    days, hours, minutes = (int(part or 0) for part in match.groups())
+    return (days * 24 + hours) * 60 + minutes
+
+
+def format_duration(minutes: int) -> str:
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
+
+
+class Leg:
+    """ One way of an offer, from the first departure to the last arrival """
+
+    __slots__ = ("origin", "departure_at", "destination", "arrival_at",
+                 "duration", "stops", "flights")
+
+    def __init__(self, origin: str, departure_at: str, destination: str,
+                 arrival_at: str, duration: int, stops: int, flights: tuple):
+        self.origin = origin
+        self.departure_at = departure_at
+        self.destination = destination
+        self.arrival_at = arrival_at
+        self.duration = duration
+        self.stops = stops
+        self.flights = flights
+
+
+class FlightOffer:
+    """
+      The parts of an Amadeus flight offer the bot shows on a card, built
+      by OfferStore.offer for the rows that are shown.
+    """
+
+    __slots__ = ("offer_id", "price", "currency", "duration", "stops",
+                 "carriers", "legs")
+
+    def __init__(self, offer_id: str, price: float, currency: str,
+                 carriers: tuple, legs: tuple):
+        self.offer_id = offer_id
+        self.price = price
+        self.currency = currency
+        self.carriers = carriers
+        self.legs = legs
+        self.duration = sum(leg.duration for leg in legs)
+        self.stops = max((leg.stops for leg in legs), default=0)
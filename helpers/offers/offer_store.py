@@ -0,0 +1,209 @@
+import sys
+import zlib
+from array import array
+
+from .flight_offer import FlightOffer, Leg, parse_duration
+
+# columns the offers can be sorted by, each with the column breaking ties
+SORT_KEYS = {
+    "price": ("prices", "durations"),
+    "duration": ("durations", "prices"),
+    "departure": ("departures", "prices"),
+}
+
+
+def _minute_of_day(timestamp: str) -> int:
+    """ Minutes since midnight of a local time such as 2020-03-01T18:30:00 """
+    try:
+        return int(timestamp[11:13]) * 60 + int(timestamp[14:16])
+    except (TypeError, ValueError):
+        return 0
+
+
+class OfferStore:
+    """
+      The offers of a search stored column by column.
+
+      Amadeus offers are parsed once into arrays of prices, durations,
+      stops, carriers and departure times. Repeated strings such as
+      carriers, airports and times are kept once in a value table and
+      referenced by position. Sorting, filtering and paging work on row
+      numbers over the arrays; FlightOffer views are only built for the
+      rows that are shown.
+    """
+
+    def __init__(self, offers=None):
+        self.prices = array("d")
+        self.durations = array("I")
+        self.stops = array("B")
+        self.departures = array("H")
+        self.carriers = array("I")
+        self.currencies = array("I")
+        self.offer_ids = array("I")
+        # offer i has the legs from leg_starts[i] up to leg_starts[i + 1]
+        self.leg_starts = array("I", [0])
+        self.leg_origins = array("I")
+        self.leg_destinations = array("I")
+        self.leg_departures = array("I")
+        self.leg_arrivals = array("I")
+        self.leg_durations = array("I")
+        self.leg_stops = array("B")
+        self.leg_flights = array("I")
+        self._values = []
+        self._positions = {}
+        self.extend(offers or ())
+
+    def __len__(self):
+        return len(self.prices)
+
+    def add(self, offer: dict):
+        """ Append an offer of the Amadeus flight offers API """
+        price = offer["price"]
+        itineraries = offer["itineraries"]
+        # parse the whole offer before touching the columns so that a
+        # malformed offer leaves them aligned
+        legs = []
+        for itinerary in itineraries:
+            segments = itinerary["segments"]
+            first, last = segments[0], segments[-1]
+            legs.append((
+                first["departure"]["iataCode"], last["arrival"]["iataCode"],
+                first["departure"]["at"], last["arrival"]["at"],
+                parse_duration(itinerary.get("duration")), len(segments) - 1,
+                tuple(f"{segment['carrierCode']}{segment['number']}"
+                      for segment in segments),
+            ))
+        total = float(price.get("grandTotal") or price["total"])
+        carriers = offer.get("validatingAirlineCodes") or \
+            [itineraries[0]["segments"][0]["carrierCode"]]
+
+        intern = self._intern
+        self.prices.append(total)
+        self.durations.append(sum(leg[4] for leg in legs))
+        self.stops.append(max((leg[5] for leg in legs), default=0))
+        self.departures.append(_minute_of_day(legs[0][2]))
+        self.carriers.append(intern(carriers[0]))
+        self.currencies.append(intern(price.get("currency")))
+        self.offer_ids.append(intern(offer.get("id")))
+        for origin, destination, departure_at, arrival_at, duration, stops, flights in legs:
+            self.leg_origins.append(intern(origin))
+            self.leg_destinations.append(intern(destination))
+            self.leg_departures.append(intern(departure_at))
+            self.leg_arrivals.append(intern(arrival_at))
+            self.leg_durations.append(duration)
+            self.leg_stops.append(stops)
+            self.leg_flights.append(intern(flights))
+        self.leg_starts.append(len(self.leg_durations))
+
+    def extend(self, offers):
+        for offer in offers:
+            self.add(offer)
+
+    def offer(self, row: int) -> FlightOffer:
+        """ The offer of a row, as shown on a card """
+        values = self._values
+        legs = tuple(
+            Leg(origin=values[self.leg_origins[leg]],
+                departure_at=values[self.leg_departures[leg]],
+                destination=values[self.leg_destinations[leg]],
+                arrival_at=values[self.leg_arrivals[leg]],
+                duration=self.leg_durations[leg],
+                stops=self.leg_stops[leg],
+                flights=values[self.leg_flights[leg]])
+            for leg in range(self.leg_starts[row], self.leg_starts[row + 1]))
+        return FlightOffer(
+            offer_id=values[self.offer_ids[row]],
+            price=self.prices[row],
+            currency=values[self.currencies[row]],
+            carriers=(values[self.carriers[row]],),
+            legs=legs,
+        )
+
+    def carrier(self, row: int) -> str:
+        return self._values[self.carriers[row]]
+
+    def sort(self, rows=None, by: str = "price") -> list:
+        """ Rows ordered by one of SORT_KEYS, all rows by default """
+        primary, secondary = (getattr(self, name) for name in SORT_KEYS[by])
+        rows = sorted(range(len(self)) if rows is None else rows,
+                      key=secondary.__getitem__)
+        # stable, so rows with the same primary value stay in secondary order
+        rows.sort(key=primary.__getitem__)
+        return rows
+
+    def filter(self, rows=None, direct: bool = False, max_price: float = None,
+               departs_after: int = None, carrier: str = None) -> list:
+        """
+          Rows matching every given condition, departs_after is in minutes
+          since midnight
+        """
+        rows = range(len(self)) if rows is None else rows
+        if direct:
+            stops = self.stops
+            rows = [row for row in rows if not stops[row]]
+        if max_price is not None:
+            prices = self.prices
+            rows = [row for row in rows if prices[row] <= max_price]
+        if departs_after is not None:
+            departures = self.departures
+            rows = [row for row in rows if departures[row] >= departs_after]
+        if carrier is not None:
+            position = self._positions.get(carrier)
+            carriers = self.carriers
+            rows = [row for row in rows if carriers[row] == position]
+        return list(rows)
+
+    def page(self, rows: list, page: int, size: int) -> list:
+        return rows[page * size:(page + 1) * size]
+
+    def top(self, count: int = 3) -> list:
+        """
+          The cheapest and the fastest offers, followed by the next cheapest
+          ones, as (label, row) pairs
+        """
+        if not len(self):
+            return []
+        cheapest = self.sort(by="price")
+        fastest = self.sort(by="duration")[0]
+        ranked = [("Cheapest", cheapest[0])]
+        if fastest != cheapest[0]:
+            ranked.append(("Fastest", fastest))
+        for row in cheapest[1:]:
+            if len(ranked) >= count:
+                break
+            if row != fastest:
+                ranked.append(("Best price", row))
+        return ranked[:count]
+
+    def nbytes(self) -> int:
+        """ Approximate memory held by the store, in bytes """
+        size = sys.getsizeof(self) + sys.getsizeof(self._values) + sys.getsizeof(self._positions)
+        size += sum(sys.getsizeof(column) for column in vars(self).values()
+                    if isinstance(column, array))
+        for value in self._values:
+            size += sys.getsizeof(value)
+            if isinstance(value, tuple):
+                size += sum(sys.getsizeof(item) for item in value)
+        return size
+
+    def fingerprint(self) -> int:
+        """
+          Checksum of the columns, which tells two results of the same
+          search apart, e.g. before and after the offers were refreshed
+        """
+        checksum = 0
+        for column in vars(self).values():
+            if isinstance(column, array):
+                checksum = zlib.crc32(column.tobytes(), checksum)
+        return checksum
+
+    def _intern(self, value) -> int:
+        position = self._positions.get(value)
+        if position is None:
+            position = self._positions[value] = len(self._values)
+            self._values.append(value)
+        return position
+
+
+def offers_size(store: OfferStore) -> int:
+    return store.nbytes()
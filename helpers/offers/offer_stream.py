@@ -0,0 +1,139 @@
+import codecs
+import json
+import re
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# parser states
+START, KEY, COLON, VALUE, AFTER_VALUE, ITEM, AFTER_ITEM, DONE = range(8)
+
+# keep consumed text around until it outgrows this many characters
+COMPACT_AFTER = 1 << 16
+
+
+class OfferStreamParser:
+    """
+      Incremental parser of an Amadeus flight-offers response.
+
+      Feed it the body as it arrives and it returns each element of the top
+      level "data" array as soon as the element is complete, without waiting
+      for the rest of the payload. The other top level members, such as
+      "meta" and "dictionaries", are kept in members.
+    """
+
+    def __init__(self, array_name: str = "data"):
+        self.array_name = array_name
+        self.members = {}
+        self.count = 0
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._state = START
+        self._key = None
+        self._final = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == DONE
+
+    def feed(self, chunk: bytes) -> list:
+        """ Parse the next part of the body and return the completed items """
+        self._buffer += self._utf8.decode(chunk)
+        return self._parse()
+
+    def close(self) -> list:
+        """ Parse the end of the body, which must complete the document """
+        self._buffer += self._utf8.decode(b"", final=True)
+        self._final = True
+        items = self._parse()
+        if self._state != DONE:
+            raise ValueError("Incomplete flight offers response")
+        return items
+
+    def _parse(self) -> list:
+        items = []
+        buffer = self._buffer
+        pos = self._pos
+        state = self._state
+        while state != DONE:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if state == START:
+                if char != "{":
+                    raise ValueError("Expected a JSON object")
+                pos += 1
+                state = KEY
+            elif state == KEY:
+                if char == "}":
+                    pos += 1
+                    state = DONE
+                    continue
+                value, end = self._decode(buffer, pos)
+                if end is None:
+                    break
+                self._key = value
+                pos = end
+                state = COLON
+            elif state == COLON:
+                if char != ":":
+                    raise ValueError("Expected ':'")
+                pos += 1
+                state = VALUE
+            elif state == VALUE:
+                if self._key == self.array_name and char == "[":
+                    pos += 1
+                    state = ITEM
+                    continue
+                value, end = self._decode(buffer, pos)
+                if end is None:
+                    break
+                self.members[self._key] = value
+                pos = end
+                state = AFTER_VALUE
+            elif state == AFTER_VALUE:
+                if char not in ",}":
+                    raise ValueError("Expected ',' or '}'")
+                pos += 1
+                state = KEY if char == "," else DONE
+            elif state == ITEM:
+                if char == "]":
+                    pos += 1
+                    state = AFTER_VALUE
+                    continue
+                value, end = self._decode(buffer, pos)
+                if end is None:
+                    break
+                items.append(value)
+                pos = end
+                state = AFTER_ITEM
+            elif state == AFTER_ITEM:
+                if char not in ",]":
+                    raise ValueError("Expected ',' or ']'")
+                pos += 1
+                state = ITEM if char == "," else AFTER_VALUE
+
+        if pos > COMPACT_AFTER:
+            buffer = buffer[pos:]
+            pos = 0
+        self._buffer = buffer
+        self._pos = pos
+        self._state = state
+        self.count += len(items)
+        return items
+
+    def _decode(self, buffer: str, pos: int):
+        """ Decode the value at pos, (None, None) if it is not complete yet """
+        try:
+            value, end = self._decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if self._final:
+                raise
+            return None, None
+        # numbers can be cut short by the end of a chunk without failing, so
+        # a value is only complete once something follows it
+        if end == len(buffer) and not self._final:
+            return None, None
+        return value, end
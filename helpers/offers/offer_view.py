@@ -0,0 +1,66 @@
+from .offer_store import OfferStore
+
+
+class OfferView:
+    """
+      A conversation's way through the offers of its last search: the
+      order, the filter and the rows already shown.
+
+      Changing the order or the filter starts the listing over, the store
+      itself is shared and never copied. A view is rebuilt on every turn
+      from the order, filter, cursor and shown rows kept in the state.
+    """
+
+    __slots__ = ("store", "url", "by", "direct", "_shown", "_rows", "_cursor")
+
+    def __init__(self, store: OfferStore, url: str = None, shown=(),
+                 by: str = "price", direct: bool = False, cursor: int = 0):
+        self.store = store
+        self.url = url
+        self.by = by
+        self.direct = direct
+        self._shown = set(shown)
+        self._rows = None
+        self._cursor = cursor
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def cursor(self) -> int:
+        return self._cursor
+
+    @property
+    def shown(self) -> list:
+        return sorted(self._shown)
+
+    @property
+    def rows(self) -> list:
+        if self._rows is None:
+            self._rows = self.store.sort(self.store.filter(direct=self.direct), by=self.by)
+        return self._rows
+
+    def sort_by(self, by: str):
+        self.by = by
+        self._restart()
+
+    def only_direct(self, direct: bool = True):
+        self.direct = direct
+        self._restart()
+
+    def next_page(self, size: int) -> list:
+        """ The next rows not shown yet, marked as shown """
+        rows = self.rows
+        page = []
+        while self._cursor < len(rows) and len(page) < size:
+            row = rows[self._cursor]
+            self._cursor += 1
+            if row not in self._shown:
+                page.append(row)
+        self._shown.update(page)
+        return page
+
+    def _restart(self):
+        self._shown.clear()
+        self._rows = None
+        self._cursor = 0
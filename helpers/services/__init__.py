@@ -1 +1,9 @@
-from .http_service import HttpService
+from .http_service import HttpService, HttpResponse, StreamedResponse
+from .fan_out_executor import FanOutExecutor
+from .prefetcher import Prefetcher
+from .upstream_guard import (
+    UpstreamGuard,
+    UpstreamUnavailableError,
+    TokenBucket,
+    CircuitBreaker,
+)
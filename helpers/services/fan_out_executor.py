@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+
+class FanOutExecutor:
+    """
+      Runs many upstream calls concurrently with a bound on how many are in
+      flight at once.
+
+      The bound is shared by every fan out of the executor so that
+      concurrent conversations together stay within the upstream rate
+      limits. Each call has its own timeout and calls that have not started
+      by the deadline of their fan out are skipped.
+    """
+
+    def __init__(self, concurrency: int = 8, timeout: float = 8):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.calls = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self._semaphore = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # created lazily so that it is bound to the serving event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def map(self, func, items, deadline: float = None) -> list:
+        """
+          Await func(item) for every item and return the results in the order
+          of the items. Failed calls return their exception instead, calls
+          cut short by their timeout or by the deadline, in seconds from now,
+          return an asyncio.TimeoutError.
+        """
+        deadline_at = None if deadline is None else time.monotonic() + deadline
+        return await asyncio.gather(
+            *[self._call(func, item, deadline_at) for item in items],
+            return_exceptions=True)
+
+    async def _call(self, func, item, deadline_at):
+        async with self.semaphore:
+            timeout = self.timeout
+            if deadline_at is not None:
+                timeout = min(timeout, deadline_at - time.monotonic())
+                if timeout <= 0:
+                    self.skipped += 1
+                    raise asyncio.TimeoutError()
+            self.calls += 1
+            try:
+                return await asyncio.wait_for(func(item), timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+        }
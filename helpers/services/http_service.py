@@ -1,15 +1,103 @@
-import requests
+import json
+
+import aiohttp
+
+
+class HttpResponse:
+    """ Fully read upstream response returned by HttpService """
+
+    def __init__(self, status_code: int, body: bytes, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.body)
+
+    def release(self):
+        """ Nothing to release, the body has been read already """
+
+
+class StreamedResponse:
+    """ Upstream response whose body is read as it arrives """
+
+    def __init__(self, response: aiohttp.ClientResponse):
+        self.status_code = response.status
+        self.headers = response.headers
+        self._response = response
+
+    async def iter_chunks(self, chunk_size: int = 1 << 16):
+        async for chunk in self._response.content.iter_chunked(chunk_size):
+            yield chunk
+
+    async def read(self) -> HttpResponse:
+        body = await self._response.read()
+        return HttpResponse(self.status_code, body, self.headers)
+
+    def release(self):
+        """ Return the connection to the pool, the body is discarded """
+        self._response.release()
 
 
 class HttpService:
-    def __init__(self):
-        self.http_conn = requests.Session()
+    """
+      Non-blocking http client backed by a pooled aiohttp ClientSession.
+
+      The session is created lazily on first use so that it is bound to the
+      event loop serving the bot, and keep-alive connections are reused across
+      conversations.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 20,
+                 timeout: float = 10, connect_timeout: float = 5,
+                 keepalive_timeout: float = 30):
+        self.headers = {}
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout, connect=connect_timeout)
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
 
-    def get(self, url, params={}):
-        return self.http_conn.get(url, params=params)
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout)
+        return self._session
 
-    def post(self, url, data={}):
-        return self.http_conn.post(url, data=data)
+    async def get(self, url, params=None):
+        return await self.request("GET", url, params=params or {})
+
+    async def post(self, url, data=None):
+        return await self.request("POST", url, data=data or {})
+
+    async def request(self, method, url, **kwargs):
+        async with self.session.request(
+                method, url, headers=self.headers, **kwargs) as res:
+            body = await res.read()
+            return HttpResponse(res.status, body, res.headers)
+
+    async def stream(self, method, url, **kwargs) -> StreamedResponse:
+        """ Send a request and return once the headers are in, release the result when done """
+        res = await self.session.request(
+            method, url, headers=self.headers, **kwargs)
+        return StreamedResponse(res)
 
     def config_service(self, headers):
-        self.http_conn.headers.update(headers)
+        """ Update the default headers, a None value removes the header """
+        for name, value in headers.items():
+            if value is None:
+                self.headers.pop(name, None)
+            else:
+                self.headers[name] = value
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
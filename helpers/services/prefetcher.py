@@ -0,0 +1,72 @@
+import asyncio
+from functools import partial
+
+
+class Prefetcher:
+    """
+      Bounded set of speculative background tasks, at most one per owner
+      (a conversation for example), each tagged with the key of the result
+      it prepares.
+
+      Starting a task cancels the previous task of its owner, and no task
+      is started while max_tasks are running. Failures of speculative work
+      are only counted.
+    """
+
+    def __init__(self, max_tasks: int = 20):
+        self.max_tasks = max_tasks
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self.failed = 0
+        self._tasks = {}
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def start(self, owner, key, coroutine_function, *args) -> bool:
+        """ Run coroutine_function(*args) in the background if there is room for it """
+        self.cancel(owner)
+        if len(self._tasks) >= self.max_tasks:
+            self.skipped += 1
+            return False
+        task = asyncio.ensure_future(coroutine_function(*args))
+        self._tasks[owner] = (key, task)
+        task.add_done_callback(partial(self._done, owner))
+        self.started += 1
+        return True
+
+    def cancel(self, owner, keep_key=None):
+        """ Cancel the task of owner, unless it prepares keep_key """
+        key, task = self._tasks.get(owner, (None, None))
+        if task is None or (keep_key is not None and key == keep_key):
+            return
+        del self._tasks[owner]
+        if not task.done():
+            task.cancel()
+            self.cancelled += 1
+
+    def close(self):
+        for owner in list(self._tasks):
+            self.cancel(owner)
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._tasks),
+            "started": self.started,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
+
+    def _done(self, owner, task):
+        if self._tasks.get(owner, (None, None))[1] is task:
+            del self._tasks[owner]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
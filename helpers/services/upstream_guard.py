@@ -0,0 +1,168 @@
+import asyncio
+import time
+from collections import Counter
+
+from aiohttp import ClientError
+
+
+class UpstreamUnavailableError(Exception):
+    """ Raised when a call is not sent because its upstream is overloaded or unhealthy """
+
+
+class TokenBucket:
+    """
+      Token bucket limiting the calls to an upstream to rate per second,
+      with bursts of up to burst calls.
+
+      Calls over the limit queue for their turn. A call is shed straight
+      away instead when the queue is full or when its turn would come after
+      its deadline, so that waiting calls cannot pile up.
+    """
+
+    def __init__(self, rate: float, burst: int, max_queue: int = 100):
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.shed = 0
+        # negative while calls wait, each of them holds one token
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+
+    @property
+    def waiting(self) -> int:
+        self._refill()
+        return max(0, int(-self._tokens + 0.999))
+
+    async def acquire(self, deadline: float = None):
+        """ Wait for a token, deadline is the latest monotonic time worth waiting until """
+        self._refill()
+        wait = 0.0
+        if self._tokens < 1:
+            wait = (1 - self._tokens) / self.rate
+            if (self.waiting >= self.max_queue
+                    or (deadline is not None and time.monotonic() + wait > deadline)):
+                self.shed += 1
+                raise UpstreamUnavailableError("Upstream rate limit queue is full")
+        self._tokens -= 1
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # hand the turn back to the calls still waiting
+                self._tokens += 1
+                raise
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """
+      Fails calls fast once an upstream has failed failure_threshold times
+      in a row. After reset_timeout seconds a single trial call is let
+      through, its outcome closes the circuit again or keeps it open.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    def before_call(self):
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return
+        if self.state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return
+        self.rejected += 1
+        raise UpstreamUnavailableError("Upstream circuit is open")
+
+    def record_success(self):
+        self.failures = 0
+        self.state = CLOSED
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+        self._trial_running = False
+
+    def release(self):
+        """ The call ended without telling anything about the upstream health """
+        self._trial_running = False
+
+
+def is_upstream_failure(res) -> bool:
+    return res.status_code == 429 or res.status_code >= 500
+
+
+class UpstreamGuard:
+    """
+      Rate limiter, timeout and circuit breaker around the calls to one
+      upstream API.
+
+      Calls wait at most max_wait seconds for their turn and take at most
+      timeout seconds. Errors, timeouts and responses is_failure rejects
+      (429 and 5xx by default) count as failures of the upstream.
+    """
+
+    def __init__(self, name: str, rate: float = 10, burst: int = 10,
+                 max_queue: int = 100, max_wait: float = 5, timeout: float = 10,
+                 failure_threshold: int = 5, reset_timeout: float = 30,
+                 is_failure=is_upstream_failure):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst, max_queue)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.is_failure = is_failure
+        self.calls = 0
+        # calls made by outcome: the response status, timeout or error
+        self.statuses = Counter()
+
+    async def call(self, func, *args, deadline: float = None):
+        """ Await func(*args), raising UpstreamUnavailableError if it is shed or the circuit is open """
+        self.breaker.before_call()
+        try:
+            max_deadline = time.monotonic() + self.max_wait
+            await self.bucket.acquire(
+                max_deadline if deadline is None else min(deadline, max_deadline))
+            self.calls += 1
+            res = await asyncio.wait_for(func(*args), self.timeout)
+        except (ClientError, asyncio.TimeoutError) as error:
+            self.statuses["timeout" if isinstance(error, asyncio.TimeoutError) else "error"] += 1
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.statuses[str(res.status_code)] += 1
+        if self.is_failure(res):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return res
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "calls": self.calls,
+            "consecutive_failures": self.breaker.failures,
+            "rejected": self.breaker.rejected,
+            "shed": self.bucket.shed,
+            "waiting": self.bucket.waiting,
+            "statuses": dict(self.statuses),
+        }
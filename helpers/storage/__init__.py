@@ -0,0 +1,5 @@
+from .documents import StorageConflictError, JsonPickleCodec
+from .sqlite_storage import SqliteStorage
+from .redis_client import RedisClient, RedisError
+from .redis_storage import RedisStorage
+from .turn_state_saver import TurnStateSaver
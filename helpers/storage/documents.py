@@ -0,0 +1,57 @@
+""" Shared eTag and serialisation handling of the persistent storages """
+import uuid
+
+import jsonpickle
+
+# length of the eTags generated by new_e_tag
+E_TAG_LENGTH = 32
+
+
+class StorageConflictError(KeyError):
+    """ Raised when a write was based on an outdated eTag """
+
+
+def new_e_tag() -> str:
+    return uuid.uuid4().hex
+
+
+def get_e_tag(change):
+    if isinstance(change, dict):
+        return change.get("e_tag")
+    return getattr(change, "e_tag", None)
+
+
+def set_e_tag(change, e_tag: str):
+    if isinstance(change, dict):
+        change["e_tag"] = e_tag
+    else:
+        change.e_tag = e_tag
+
+
+def is_conflict(expected_e_tag, stored_e_tag) -> bool:
+    """ A write conflicts when it carries an eTag other than the stored one """
+    return (expected_e_tag not in (None, "", "*")
+            and stored_e_tag is not None
+            and expected_e_tag != stored_e_tag)
+
+
+class JsonPickleCodec:
+    """ Default codec, serialises documents with jsonpickle """
+
+    def encode(self, document) -> bytes:
+        return jsonpickle.encode(document, keys=True).encode("utf-8")
+
+    def decode(self, payload: bytes):
+        return jsonpickle.decode(payload.decode("utf-8"), keys=True)
+
+
+def encode_document(change, codec) -> bytes:
+    if isinstance(change, dict):
+        change = {k: v for k, v in change.items() if k != "e_tag"}
+    return codec.encode(change)
+
+
+def decode_document(payload: bytes, e_tag: str, codec):
+    document = codec.decode(payload)
+    set_e_tag(document, e_tag)
+    return document
@@ -0,0 +1,139 @@
+import asyncio
+from collections import deque
+from urllib.parse import urlparse
+
+
+class RedisError(Exception):
+    """ Error reply returned by the server """
+
+
+class RedisClient:
+    """
+      Minimal pipelining client for the Redis protocol (RESP2).
+
+      Commands are written to a single connection as soon as they are issued
+      and replies are matched to callers in order by a reader task, so
+      concurrent turns do not wait for each other's round trips.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0"):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._waiters = deque()
+        self._connect_lock = None
+
+    async def execute(self, *args):
+        await self._ensure_connected()
+        return await self._send(args)
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        self._fail_waiters(ConnectionError("Redis connection closed"))
+        self._reader = self._writer = self._reader_task = None
+
+    async def _ensure_connected(self):
+        if self._writer is not None:
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                await self._handshake(reader, writer)
+            except BaseException:
+                writer.close()
+                raise
+            # only published once authenticated on the right database, so
+            # that no command can run on the connection before SELECT
+            self._reader = reader
+            self._writer = writer
+            self._reader_task = asyncio.ensure_future(self._read_replies())
+
+    async def _handshake(self, reader, writer):
+        commands = []
+        if self.password:
+            commands.append(("AUTH", self.password))
+        if self.db:
+            commands.append(("SELECT", self.db))
+        for args in commands:
+            writer.write(encode_command(args))
+            reply = await read_reply(reader)
+            if isinstance(reply, RedisError):
+                raise reply
+
+    def _send(self, args):
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.append(future)
+        self._writer.write(encode_command(args))
+        return future
+
+    async def _read_replies(self):
+        try:
+            while True:
+                reply = await read_reply(self._reader)
+                future = self._waiters.popleft()
+                if future.done():
+                    continue
+                if isinstance(reply, RedisError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            # connection lost, the next command reconnects
+            if self._writer is not None:
+                self._writer.close()
+            self._reader = self._writer = self._reader_task = None
+            self._fail_waiters(ConnectionError(f"Redis connection lost: {error}"))
+
+    def _fail_waiters(self, error):
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+
+def encode_command(args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            value = arg
+        else:
+            value = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(value), value))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readuntil(b"\r\n")
+    kind, value = line[:1], line[1:-2]
+    if kind == b"+":
+        return value.decode("utf-8")
+    if kind == b"-":
+        return RedisError(value.decode("utf-8"))
+    if kind == b":":
+        return int(value)
+    if kind == b"$":
+        length = int(value)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(value)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Unexpected reply from Redis: {line!r}")
@@ -0,0 +1,110 @@
+import hashlib
+from typing import Dict, List
+
+from botbuilder.core import Storage
+
+from .documents import (
+    JsonPickleCodec,
+    E_TAG_LENGTH,
+    StorageConflictError,
+    decode_document,
+    encode_document,
+    get_e_tag,
+    new_e_tag,
+    set_e_tag,
+)
+from .redis_client import RedisClient, RedisError
+
+# Checks the expected eTags of every key in the batch and only then writes
+# them all, so a batch is applied atomically. Values are stored as the eTag
+# followed by the serialised document.
+# ARGV: ttl in milliseconds, then an expected eTag and a value per key.
+# Returns 0 on success or the position of the first conflicting key.
+WRITE_SCRIPT = """
+for i, key in ipairs(KEYS) do
+  local expected = ARGV[i * 2]
+  if expected ~= '' and expected ~= '*' then
+    local current = redis.call('GET', key)
+    if current and string.sub(current, 1, %(length)d) ~= expected then
+      return i
+    end
+  end
+end
+for i, key in ipairs(KEYS) do
+  redis.call('SET', key, ARGV[i * 2 + 1], 'PX', ARGV[1])
+end
+return 0
+""" % {"length": E_TAG_LENGTH}
+WRITE_SCRIPT_SHA = hashlib.sha1(WRITE_SCRIPT.encode("utf-8")).hexdigest()
+
+
+class RedisStorage(Storage):
+    """
+      Bot state storage for any server speaking the Redis protocol.
+
+      Reads are a single MGET, writes a single atomic script checking the
+      eTags of the whole batch and every entry expires after ttl seconds
+      without a write.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0",
+                 ttl: float = 7 * 24 * 60 * 60, prefix: str = "bot_state:",
+                 codec=None):
+        self.client = RedisClient(url)
+        self.codec = codec or JsonPickleCodec()
+        self.ttl = ttl
+        self.prefix = prefix
+        self._script_loaded = False
+
+    async def read(self, keys: List[str]):
+        keys = list(keys or [])
+        if not keys:
+            return {}
+        values = await self.client.execute(
+            "MGET", *[self.prefix + key for key in keys])
+        return {key: decode_document(
+                    value[E_TAG_LENGTH:], value[:E_TAG_LENGTH].decode("ascii"), self.codec)
+                for key, value in zip(keys, values) if value is not None}
+
+    async def write(self, changes: Dict[str, object]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+        if not changes:
+            return
+        keys = list(changes)
+        e_tags = [new_e_tag() for _ in keys]
+        args = [int(self.ttl * 1000)]
+        for key, e_tag in zip(keys, e_tags):
+            change = changes[key]
+            args.append(get_e_tag(change) or "")
+            args.append(e_tag.encode("ascii") + encode_document(change, self.codec))
+        conflict = await self._eval_write(
+            [self.prefix + key for key in keys], args)
+        if conflict:
+            key = keys[conflict - 1]
+            raise StorageConflictError(
+                "Etag conflict.\nOriginal: %s" % get_e_tag(changes[key]))
+        for key, e_tag in zip(keys, e_tags):
+            set_e_tag(changes[key], e_tag)
+
+    async def delete(self, keys: List[str]):
+        keys = list(keys or [])
+        if keys:
+            await self.client.execute("DEL", *[self.prefix + key for key in keys])
+
+    async def _eval_write(self, keys, args):
+        if not self._script_loaded:
+            await self.client.execute("SCRIPT", "LOAD", WRITE_SCRIPT)
+            self._script_loaded = True
+        try:
+            return await self.client.execute(
+                "EVALSHA", WRITE_SCRIPT_SHA, len(keys), *keys, *args)
+        except RedisError as error:
+            # the script cache was flushed, e.g. by a server restart
+            if not str(error).startswith("NOSCRIPT"):
+                raise
+            return await self.client.execute(
+                "EVAL", WRITE_SCRIPT, len(keys), *keys, *args)
+
+    async def close(self):
+        await self.client.close()
@@ -0,0 +1,137 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from botbuilder.core import Storage
+
+from .documents import (
+    JsonPickleCodec,
+    StorageConflictError,
+    decode_document,
+    encode_document,
+    get_e_tag,
+    is_conflict,
+    new_e_tag,
+    set_e_tag,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bot_state (
+    key TEXT PRIMARY KEY,
+    e_tag TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+class SqliteStorage(Storage):
+    """
+      File backed bot state storage.
+
+      Reads and writes are batched into a single statement or transaction,
+      writes are checked against the stored eTag and idle entries expire
+      after ttl seconds. The database runs in WAL mode so several worker
+      processes on one node can share the file.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 60 * 60,
+                 purge_interval: float = 60 * 60, codec=None):
+        self.path = path
+        self.codec = codec or JsonPickleCodec()
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._next_purge = 0
+        self._connection = None
+        # sqlite connections are used from a single thread
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def read(self, keys: List[str]):
+        keys = list(keys or [])
+        if not keys:
+            return {}
+        rows = await self._run(self._read, keys)
+        return {key: decode_document(value, e_tag, self.codec) for key, e_tag, value in rows}
+
+    async def write(self, changes: Dict[str, object]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+        if not changes:
+            return
+        documents = [(key, get_e_tag(change), new_e_tag(), encode_document(change, self.codec))
+                     for key, change in changes.items()]
+        await self._run(self._write, documents)
+        for (key, change), document in zip(changes.items(), documents):
+            set_e_tag(change, document[2])
+
+    async def delete(self, keys: List[str]):
+        keys = list(keys or [])
+        if keys:
+            await self._run(self._delete, keys)
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(SCHEMA)
+        return self._connection
+
+    def _read(self, keys):
+        placeholders = ",".join("?" * len(keys))
+        return self.connection.execute(
+            f"SELECT key, e_tag, value FROM bot_state "
+            f"WHERE key IN ({placeholders}) AND expires_at > ?",
+            keys + [time.time()]).fetchall()
+
+    def _write(self, documents):
+        now = time.time()
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            keys = [document[0] for document in documents]
+            placeholders = ",".join("?" * len(keys))
+            stored = dict(connection.execute(
+                f"SELECT key, e_tag FROM bot_state "
+                f"WHERE key IN ({placeholders}) AND expires_at > ?",
+                keys + [now]).fetchall())
+            for key, expected, _, _ in documents:
+                if is_conflict(expected, stored.get(key)):
+                    raise StorageConflictError(
+                        "Etag conflict.\nOriginal: %s\r\nCurrent: %s"
+                        % (expected, stored.get(key)))
+            connection.executemany(
+                "INSERT OR REPLACE INTO bot_state (key, e_tag, value, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, e_tag, value, now + self.ttl)
+                 for key, _, e_tag, value in documents])
+            if now >= self._next_purge:
+                connection.execute(
+                    "DELETE FROM bot_state WHERE expires_at <= ?", (now,))
+                self._next_purge = now + self.purge_interval
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _delete(self, keys):
+        placeholders = ",".join("?" * len(keys))
+        self.connection.execute(
+            f"DELETE FROM bot_state WHERE key IN ({placeholders})", keys)
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,44 @@
+from botbuilder.core import BotState, TurnContext
+
+from .documents import get_e_tag
+
+
+class TurnStateSaver:
+    """
+      Persists the state changed during a turn once, at the end of the turn.
+
+      Bot states sharing a storage are written in a single batched write and
+      states whose properties did not change are not written at all.
+
+      BotState has no public accessor for its storage or for the turn_state
+      key it caches a turn's state under, so both are read from its private
+      attributes (botbuilder-core is pinned to 4.7.1). They are read here,
+      when the bot is built, so that a botbuilder change fails at startup
+      rather than leaving the state unsaved.
+    """
+
+    def __init__(self, *bot_states: BotState):
+        self.states = [(bot_state, bot_state._storage, bot_state._context_service_key)
+                       for bot_state in bot_states]
+
+    async def save_changes(self, turn_context: TurnContext):
+        batches = {}
+        for bot_state, storage, cache_key in self.states:
+            cached_state = turn_context.turn_state.get(cache_key)
+            if cached_state is None:
+                continue
+            state_hash = cached_state.compute_hash(cached_state.state)
+            if state_hash == cached_state.hash:
+                continue
+            _, changes, saved = batches.setdefault(id(storage), (storage, {}, []))
+            changes[bot_state.get_storage_key(turn_context)] = cached_state.state
+            saved.append((cached_state, state_hash))
+
+        for storage, changes, saved in batches.values():
+            e_tags = [get_e_tag(cached_state.state) for cached_state, _ in saved]
+            await storage.write(changes)
+            for (cached_state, state_hash), e_tag in zip(saved, e_tags):
+                # the storage may have assigned a new eTag to the state
+                if get_e_tag(cached_state.state) != e_tag:
+                    state_hash = cached_state.compute_hash(cached_state.state)
+                cached_state.hash = state_hash
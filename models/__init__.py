@@ -1,2 +1,3 @@
 from .flight_search import FlightSearch
-from .conversation_flow import ConversationFlow, Question, State, ChatState
\ No newline at end of file
+from .conversation_flow import ConversationFlow, Question, State, ChatState, OfferBrowsing
+from .state_codec import StateCodec
@@ -16,12 +16,17 @@ class Question(Enum):
 
 
 class ConversationFlow:
+    __slots__ = ("last_question_asked", "question_being_modified", "airport_choices")
+
     def __init__(
         self, last_question_asked: Question = Question.NONE,
         question_being_modified: Question = Question.COMPLETED,
+        airport_choices: dict = None,
     ):
         self.last_question_asked = last_question_asked
         self.question_being_modified = question_being_modified
+        # airports offered at the last destination/origin step, iata -> city
+        self.airport_choices = airport_choices if airport_choices is not None else {}
 
 
 class State(Enum):
@@ -29,8 +34,38 @@ class State(Enum):
     MODIFY = 2
 
 
+class OfferBrowsing:
+    """
+      Where a conversation is in the offers of its last search: the search,
+      the fingerprint of the offers browsed, the order, the filter, the
+      position in the listing and the rows shown. Kept in the state so that
+      any worker can serve the next page; the rows only apply to offers
+      with the same fingerprint.
+    """
+
+    __slots__ = ("search", "offers", "by", "direct", "cursor", "shown")
+
+    def __init__(self, search: str, offers: int = 0, by: str = "price", direct: bool = False,
+                 cursor: int = 0, shown: list = None):
+        self.search = search
+        self.offers = offers
+        self.by = by
+        self.direct = direct
+        self.cursor = cursor
+        self.shown = shown if shown is not None else []
+
+
 class ChatState:
+    __slots__ = ("chat_state", "offer_browsing")
+
     def __init__(
-        self, chat_state: State = State.NORMAL,
+        self, chat_state: State = State.NORMAL, offer_browsing: OfferBrowsing = None,
     ):
         self.chat_state = chat_state
+        self.offer_browsing = offer_browsing
+
+    def __getattr__(self, name):
+        # only called for fields missing from documents stored before they existed
+        if name == "offer_browsing":
+            return None
+        raise AttributeError(name)
@@ -1,12 +1,22 @@
+# fields added after documents may have been stored, with the value they
+# read as in those documents
+ADDED_FIELDS = {"flexible_dates": False}
+
+
 class FlightSearch:
     """
       Flight search  state management class
     """
 
+    __slots__ = ("origin", "origin_city", "destination", "destination_city",
+                 "return_trip", "travel_date", "return_date", "cabin_class",
+                 "adults", "children", "infants", "flexible_dates")
+
     def __init__(self, origin: str = None, destination: str = None,
                  travel_date: str = None, return_date: str = None, return_trip: bool = False,
                  origin_city: str = None, destination_city: str = None, cabin_class: str = None,
-                 adults: int = 1, children: int = 0, infants: int = 0):
+                 adults: int = 1, children: int = 0, infants: int = 0,
+                 flexible_dates: bool = False):
         self.origin = origin
         self.origin_city = origin_city
         self.destination = destination
@@ -18,3 +28,14 @@ class FlightSearch:
         self.adults = adults
         self.children = children
         self.infants = infants
+        # search the days around the travel and return dates as well
+        self.flexible_dates = flexible_dates
+
+    def __getattr__(self, name):
+        # only called for fields missing from the restored document
+        if name in ADDED_FIELDS:
+            return ADDED_FIELDS[name]
+        raise AttributeError(name)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
@@ -0,0 +1,266 @@
+import struct
+from datetime import date, datetime
+
+import jsonpickle
+
+from .flight_search import FlightSearch
+from .conversation_flow import ConversationFlow, Question, State, ChatState, OfferBrowsing
+
+SCHEMA_VERSION = 1
+
+# type tags of the encoded state properties
+PICKLED = 0
+FLIGHT_SEARCH = 1
+CONVERSATION_FLOW = 2
+CHAT_STATE = 3
+# a chat state browsing the offers of its last search
+BROWSING_CHAT_STATE = 4
+
+# bits of the flight search flags, documents written before a flag
+# existed read it as unset
+RETURN_TRIP = 1
+FLEXIBLE_DATES = 2
+
+NONE_U16 = 0xFFFF
+U8 = struct.Struct("<B")
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+
+QUESTIONS = {question.value: question for question in Question}
+STATES = {state.value: state for state in State}
+
+
+class NotCompact(ValueError):
+    """ Raised for values the compact format cannot represent exactly """
+
+
+class StateCodec:
+    """
+      Compact binary encoding of bot state documents.
+
+      A document is a schema version byte followed by its properties. The
+      state models are encoded field by field with enums as small ints and
+      dates as ordinals. Any other value, or a model holding values the
+      compact format cannot represent, is stored with jsonpickle.
+    """
+
+    def encode(self, document: dict) -> bytes:
+        parts = [U8.pack(SCHEMA_VERSION), U8.pack(len(document))]
+        for name, value in document.items():
+            _write_str(parts, name, U8)
+            try:
+                tag, body = self._encode_value(value)
+            except NotCompact:
+                tag, body = PICKLED, _pickle(value)
+            parts.append(U8.pack(tag))
+            parts.append(body)
+        return b"".join(parts)
+
+    def decode(self, payload: bytes) -> dict:
+        if payload[:1] == b"{":
+            # documents written before the compact format existed
+            return jsonpickle.decode(payload.decode("utf-8"), keys=True)
+        reader = _Reader(payload)
+        version = reader.u8()
+        if version != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported state schema version {version}")
+        document = {}
+        for _ in range(reader.u8()):
+            name = reader.str(U8)
+            tag = reader.u8()
+            if tag == FLIGHT_SEARCH:
+                document[name] = _read_flight_search(reader)
+            elif tag == CONVERSATION_FLOW:
+                document[name] = _read_conversation_flow(reader)
+            elif tag == CHAT_STATE:
+                document[name] = ChatState(STATES[reader.u8()])
+            elif tag == BROWSING_CHAT_STATE:
+                document[name] = _read_browsing_chat_state(reader)
+            else:
+                length = reader.u32()
+                document[name] = jsonpickle.decode(
+                    reader.bytes(length).decode("utf-8"), keys=True)
+        return document
+
+    def _encode_value(self, value):
+        parts = []
+        if type(value) is FlightSearch:
+            _write_flight_search(parts, value)
+            return FLIGHT_SEARCH, b"".join(parts)
+        if type(value) is ConversationFlow:
+            _write_conversation_flow(parts, value)
+            return CONVERSATION_FLOW, b"".join(parts)
+        if type(value) is ChatState:
+            if value.offer_browsing is None:
+                return CHAT_STATE, U8.pack(_enum(value.chat_state, State))
+            _write_browsing_chat_state(parts, value)
+            return BROWSING_CHAT_STATE, b"".join(parts)
+        raise NotCompact(type(value).__name__)
+
+
+def _write_flight_search(parts, flight_search: FlightSearch):
+    if not isinstance(flight_search.return_trip, bool):
+        raise NotCompact("return_trip")
+    if not isinstance(flight_search.flexible_dates, bool):
+        raise NotCompact("flexible_dates")
+    parts.append(U8.pack(int(flight_search.return_trip) | FLEXIBLE_DATES * flight_search.flexible_dates))
+    for text in (flight_search.origin, flight_search.origin_city,
+                 flight_search.destination, flight_search.destination_city,
+                 flight_search.cabin_class):
+        _write_str(parts, text, U16)
+    for value in (flight_search.travel_date, flight_search.return_date):
+        parts.append(U32.pack(_date_ordinal(value)))
+    for count in (flight_search.adults, flight_search.children, flight_search.infants):
+        parts.append(U16.pack(_count(count)))
+
+
+def _read_flight_search(reader) -> FlightSearch:
+    flags = reader.u8()
+    origin, origin_city, destination, destination_city, cabin_class = (
+        reader.str(U16) for _ in range(5))
+    travel_date, return_date = (_ordinal_date(reader.u32()) for _ in range(2))
+    adults, children, infants = (_read_count(reader.u16()) for _ in range(3))
+    return FlightSearch(
+        origin=origin, destination=destination, travel_date=travel_date,
+        return_date=return_date, return_trip=bool(flags & RETURN_TRIP),
+        flexible_dates=bool(flags & FLEXIBLE_DATES),
+        origin_city=origin_city, destination_city=destination_city,
+        cabin_class=cabin_class, adults=adults, children=children, infants=infants)
+
+
+def _write_conversation_flow(parts, flow: ConversationFlow):
+    parts.append(U8.pack(_enum(flow.last_question_asked, Question)))
+    parts.append(U8.pack(_enum(flow.question_being_modified, Question)))
+    choices = flow.airport_choices
+    if not isinstance(choices, dict) or len(choices) > 0xFF:
+        raise NotCompact("airport_choices")
+    parts.append(U8.pack(len(choices)))
+    for iata, city in choices.items():
+        if iata is None or city is None:
+            raise NotCompact("airport_choices")
+        _write_str(parts, iata, U8)
+        _write_str(parts, city, U16)
+
+
+def _read_conversation_flow(reader) -> ConversationFlow:
+    last_question_asked = QUESTIONS[reader.u8()]
+    question_being_modified = QUESTIONS[reader.u8()]
+    choices = {}
+    for _ in range(reader.u8()):
+        iata = reader.str(U8)
+        choices[iata] = reader.str(U16)
+    return ConversationFlow(last_question_asked, question_being_modified, choices)
+
+
+def _write_browsing_chat_state(parts, chat_state: ChatState):
+    browsing = chat_state.offer_browsing
+    if type(browsing) is not OfferBrowsing or not isinstance(browsing.direct, bool):
+        raise NotCompact("offer_browsing")
+    parts.append(U8.pack(_enum(chat_state.chat_state, State)))
+    _write_str(parts, browsing.search, U16)
+    if type(browsing.offers) is not int or not 0 <= browsing.offers <= 0xFFFFFFFF:
+        raise NotCompact("offers")
+    parts.append(U32.pack(browsing.offers))
+    _write_str(parts, browsing.by, U8)
+    parts.append(U8.pack(int(browsing.direct)))
+    parts.append(U16.pack(_count(browsing.cursor)))
+    parts.append(U16.pack(_count(len(browsing.shown))))
+    for row in browsing.shown:
+        parts.append(U16.pack(_count(row)))
+
+
+def _read_browsing_chat_state(reader) -> ChatState:
+    chat_state = STATES[reader.u8()]
+    search = reader.str(U16)
+    offers = reader.u32()
+    by = reader.str(U8)
+    direct = bool(reader.u8())
+    cursor = reader.u16()
+    shown = [reader.u16() for _ in range(reader.u16())]
+    return ChatState(chat_state, OfferBrowsing(search, offers, by, direct, cursor, shown))
+
+
+def _enum(value, enum_type) -> int:
+    if type(value) is not enum_type or not 0 <= value.value < 0xFF:
+        raise NotCompact(enum_type.__name__)
+    return value.value
+
+
+def _write_str(parts, text, size: struct.Struct):
+    if text is None:
+        if size is U8:
+            raise NotCompact("None key")
+        parts.append(size.pack(NONE_U16))
+        return
+    if not isinstance(text, str):
+        raise NotCompact(type(text).__name__)
+    data = text.encode("utf-8")
+    limit = 0xFF if size is U8 else NONE_U16 - 1
+    if len(data) > limit:
+        raise NotCompact("string too long")
+    parts.append(size.pack(len(data)))
+    parts.append(data)
+
+
+def _date_ordinal(value) -> int:
+    if value is None:
+        return 0
+    try:
+        parsed = datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise NotCompact("date")
+    if parsed.isoformat() != value:
+        raise NotCompact("date")
+    return parsed.toordinal()
+
+
+def _ordinal_date(ordinal: int):
+    return date.fromordinal(ordinal).isoformat() if ordinal else None
+
+
+def _count(value) -> int:
+    if value is None:
+        return NONE_U16
+    if type(value) is not int or not 0 <= value < NONE_U16:
+        raise NotCompact("count")
+    return value
+
+
+def _read_count(value: int):
+    return None if value == NONE_U16 else value
+
+
+def _pickle(value) -> bytes:
+    data = jsonpickle.encode(value, keys=True).encode("utf-8")
+    return U32.pack(len(data)) + data
+
+
+class _Reader:
+    def __init__(self, payload: bytes):
+        self.payload = memoryview(payload)
+        self.offset = 0
+
+    def _unpack(self, size: struct.Struct) -> int:
+        value = size.unpack_from(self.payload, self.offset)[0]
+        self.offset += size.size
+        return value
+
+    def u8(self) -> int:
+        return self._unpack(U8)
+
+    def u16(self) -> int:
+        return self._unpack(U16)
+
+    def u32(self) -> int:
+        return self._unpack(U32)
+
+    def bytes(self, length: int) -> bytes:
+        data = bytes(self.payload[self.offset:self.offset + length])
+        self.offset += length
+        return data
+
+    def str(self, size: struct.Struct):
+        length = self._unpack(size)
+        if size is U16 and length == NONE_U16:
+            return None
+        return self.bytes(length).decode("utf-8")
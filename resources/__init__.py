@@ -1 +1,11 @@
 from .custom_adaptive_card import CustomAdaptiveCard
+from .hero_cards import HeroCards
+from .card_templates import (
+    CardTemplate,
+    FLIGHT_SUMMARY_TEMPLATE,
+    slot,
+    serialize_card,
+    static_attachment,
+    HERO_CARD,
+    ADAPTIVE_CARD,
+)
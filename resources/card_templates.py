@@ -0,0 +1,113 @@
+from botbuilder.core import CardFactory
+from botbuilder.schema import Attachment
+import botbuilder.schema as schema
+from msrest.serialization import Model, Serializer
+
+from .custom_adaptive_card import CustomAdaptiveCard
+
+SLOT_MARKER = "\u0000"
+HERO_CARD = CardFactory.content_types.hero_card
+ADAPTIVE_CARD = CardFactory.content_types.adaptive_card
+
+# serialises the botbuilder card models to their wire format
+SERIALIZER = Serializer(
+    {name: model for name, model in vars(schema).items() if isinstance(model, type)})
+
+
+def slot(name: str) -> str:
+    """ Placeholder for a value filled in when the template is rendered """
+    return f"{SLOT_MARKER}{name}{SLOT_MARKER}"
+
+
+def serialize_card(card) -> dict:
+    """ Wire format of a card model such as HeroCard, dicts are returned as is """
+    if isinstance(card, Model):
+        return SERIALIZER.body(card, type(card).__name__)
+    return card
+
+
+def static_attachment(card, content_type: str) -> Attachment:
+    """
+      Attachment for a card that never changes, built and serialised once
+      and shared between turns. It must be treated as read only.
+    """
+    return Attachment(content_type=content_type, content=serialize_card(card))
+
+
+def _slot_name(node):
+    if (isinstance(node, str) and len(node) > 2
+            and node[0] == SLOT_MARKER and node[-1] == SLOT_MARKER):
+        return node[1:-1]
+    return None
+
+
+def _compile(node):
+    """
+      Return a function rendering node from the slot values, or None when
+      node holds no slots and can be shared as is between renders.
+    """
+    name = _slot_name(node)
+    if name is not None:
+        return lambda values: values[name]
+
+    if isinstance(node, dict):
+        renderers = [(key, _compile(value)) for key, value in node.items()]
+        renderers = [(key, render) for key, render in renderers if render]
+        if not renderers:
+            return None
+
+        def render_dict(values):
+            rendered = node.copy()
+            for key, render in renderers:
+                rendered[key] = render(values)
+            return rendered
+        return render_dict
+
+    if isinstance(node, list):
+        renderers = [(index, _compile(value)) for index, value in enumerate(node)]
+        renderers = [(index, render) for index, render in renderers if render]
+        if not renderers:
+            return None
+
+        def render_list(values):
+            rendered = node[:]
+            for index, render in renderers:
+                rendered[index] = render(values)
+            return rendered
+        return render_list
+
+    return None
+
+
+class CardTemplate:
+    """
+      Card serialised once to its wire format with slots for the values
+      that vary.
+
+      Rendering only copies the containers on the path to a slot, every
+      other part of the card is shared between renders, and the connector
+      no longer has to serialise the card models on every turn. Slot values
+      must already be in wire format and rendered cards are read only.
+    """
+
+    def __init__(self, card, content_type: str):
+        self.content_type = content_type
+        self.card = serialize_card(card)
+        self._render = _compile(self.card) or (lambda values: self.card)
+
+    def render(self, values: dict) -> dict:
+        return self._render(values)
+
+    def attachment(self, values: dict) -> Attachment:
+        return Attachment(content_type=self.content_type, content=self.render(values))
+
+
+# fields of a flight search shown on its summary card, which also has the
+# url of the search results
+FLIGHT_SUMMARY_FIELDS = ("origin", "origin_city", "destination", "destination_city",
+                         "travel_date", "return_date", "return_trip", "cabin_class",
+                         "adults", "children", "infants")
+FLIGHT_SUMMARY_TEMPLATE = CardTemplate(
+    CustomAdaptiveCard.create_flight_summary_adaptive_card(
+        {name: slot(name) for name in FLIGHT_SUMMARY_FIELDS}, slot("url")),
+    ADAPTIVE_CARD)
@@ -47,7 +47,10 @@ class CustomAdaptiveCard:
 
     @staticmethod
     def create_flight_summary_adaptive_card(flight_search, flight_search_results_url):
-        return_trip = 'Yes' if flight_search["return_trip"] else 'No'
+        return_trip = flight_search["return_trip"]
+        if not isinstance(return_trip, str):
+            # a card template passes the slot of the Yes or No instead
+            return_trip = 'Yes' if return_trip else 'No'
         return {
             "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
             "version": "1.0",
@@ -312,3 +315,58 @@ class CustomAdaptiveCard:
                 }
             ],
         }
+
+    @staticmethod
+    def create_price_matrix_card(title, subtitle, column_headers, rows, highlight=None):
+        """
+          Grid of prices, one row per (label, cells) pair in rows. The cell at
+          highlight, a (row, column) pair, stands out.
+        """
+        def cell(text, bolder=False, color="default"):
+            return {
+                "type": "TextBlock",
+                "text": text,
+                "size": "small",
+                "weight": "bolder" if bolder else "default",
+                "color": color,
+                "horizontalAlignment": "center",
+            }
+
+        columns = [{
+            "type": "Column",
+            "width": "auto",
+            "items": [cell(" ")] + [cell(label, bolder=True) for label, _ in rows],
+        }]
+        for index, header in enumerate(column_headers):
+            items = [cell(header, bolder=True)]
+            for row_index, (_, cells) in enumerate(rows):
+                is_highlight = highlight == (row_index, index)
+                items.append(cell(cells[index], bolder=is_highlight,
+                                  color="good" if is_highlight else "default"))
+            columns.append({"type": "Column", "width": "auto", "items": items})
+
+        return {
+            "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+            "version": "1.0",
+            "type": "AdaptiveCard",
+            "body": [
+                {
+                    "type": "TextBlock",
+                    "text": title,
+                    "size": "large",
+                    "weight": "bolder",
+                },
+                {
+                    "type": "TextBlock",
+                    "text": subtitle,
+                    "isSubtle": True,
+                    "wrap": True,
+                    "spacing": "none",
+                },
+                {
+                    "type": "ColumnSet",
+                    "separator": True,
+                    "columns": columns,
+                },
+            ],
+        }
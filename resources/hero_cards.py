@@ -0,0 +1,130 @@
+from botbuilder.schema import (
+    CardAction,
+    CardImage,
+    ActionTypes,
+    HeroCard,
+)
+
+FLIGHT_IMAGE_URL = "https://www.bls.gov/cpi/factsheets/airline-fares-image.jpg"
+AIRPORT_IMAGE_URL = "https://www.aurecongroup.com/-/media/images/aurecon/content/projects/property/hanoi-airport/hanoi-airport-interior.jpg"
+
+
+class HeroCards:
+    @staticmethod
+    def create_welcome_card():
+        text = """
+                Hello, I am here to help you search for the
+                best flight to your destination. Pleace click the 
+                Search Flights button to proceed or Cancel to leave.
+                Incase you want to exit midway, you can type exit or cancel
+            """
+        return HeroCard(
+            title="Search Flights",
+            text=text,
+            images=[CardImage(url=FLIGHT_IMAGE_URL)],
+            buttons=[
+                CardAction(
+                    type=ActionTypes.post_back,
+                    title="Book Flight",
+                    text="book_flight",
+                    display_text="Book Flight",
+                    value="book_flight"
+                ),
+                CardAction(
+                    type=ActionTypes.post_back,
+                    title="Exit",
+                    text="exit",
+                    display_text="Exit",
+                    value="exit"
+                )
+            ]
+        )
+
+    @staticmethod
+    def create_return_trip_select_card():
+        return HeroCard(
+            title="Return Trip",
+            text="Choose if the search you are doing is for a return trip or not",
+            images=[CardImage(url=FLIGHT_IMAGE_URL)],
+            buttons=[
+                CardAction(
+                    type=ActionTypes.post_back,
+                    title="Yes",
+                    text="yes",
+                    display_text="Yes",
+                    value="yes"
+                ),
+                CardAction(
+                    type=ActionTypes.post_back,
+                    title="No",
+                    text="no",
+                    display_text="No",
+                    value="no"
+                )
+            ]
+        )
+
+    @staticmethod
+    def create_cabin_class_card():
+        return HeroCard(
+            title="Choose Cabin Class",
+            text="Please choose the cabin class for your flight",
+            images=[CardImage(url=FLIGHT_IMAGE_URL)],
+            buttons=[
+                CardAction(
+                    type=ActionTypes.post_back,
+                    title="Econony",
+                    text="Economy",
+                    display_text="Economy",
+                    value="Economy"
+                ),
+                CardAction(
+                    type=ActionTypes.post_back,
+                    title="Premium Economy",
+                    text="PremiumEconomy",
+                    display_text="Premium Economy",
+                    value="PremiumEconomy"
+                ),
+                CardAction(
+                    type=ActionTypes.post_back,
+                    title="Business",
+                    text="Business",
+                    display_text="Business",
+                    value="Business"
+                ),
+                CardAction(
+                    type=ActionTypes.post_back,
+                    title="First Class",
+                    text="First",
+                    display_text="First Class",
+                    value="First"
+                )
+            ]
+        )
+
+    @staticmethod
+    def create_modify_flight_profile_card(buttons):
+        return HeroCard(
+            title="Modify Flight Profile",
+            text="Choose the question that you need to modify",
+            images=[CardImage(url=FLIGHT_IMAGE_URL)],
+            buttons=buttons
+        )
+
+    @staticmethod
+    def create_airport_card(title, text, buttons):
+        return HeroCard(
+            title=title,
+            text=text,
+            images=[CardImage(url=AIRPORT_IMAGE_URL)],
+            buttons=buttons
+        )
+
+    @staticmethod
+    def create_flight_offer_card(title, subtitle, text, buttons):
+        return HeroCard(
+            title=title,
+            subtitle=subtitle,
+            text=text,
+            buttons=buttons
+        )
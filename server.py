@@ -0,0 +1,220 @@
+"""
+  Production entry point: python server.py
+
+  The app is imported, and so warmed up, once in the master process which
+  then forks CONFIG.WORKERS workers serving the same listening socket. The
+  master replaces workers that exit, including the ones recycled after
+  CONFIG.WORKER_MAX_REQUESTS requests. SIGTERM or SIGINT shut the workers
+  down gracefully, in-flight requests get CONFIG.SHUTDOWN_TIMEOUT seconds to
+  finish. SIGHUP replaces the workers one at a time: a new worker is started
+and the old one is only stopped once the new one serves.
+"""
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+
+from aiohttp import web
+
+from app import APP, BOT, CONFIG
+
+# seconds between checks of the workers by the master
+POLL_INTERVAL = 0.5
+# workers exiting sooner than this after being started are restarted with
+# a delay, so that a crashing worker does not fork in a tight loop
+MIN_WORKER_SECONDS = 1
+
+
+def create_socket(host: str, port: int) -> socket.socket:
+    """
+      The listening socket shared by the workers. SO_REUSEPORT lets a new
+      server bind the port while the old one drains during a redeploy.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+    return sock
+
+
+def recycle_middleware(max_requests: int):
+    """ Gracefully stop the worker once it has served about max_requests requests """
+    # spread the restarts so that the workers are not replaced all at once
+    limit = max_requests + random.randint(0, max_requests // 10)
+    served = 0
+
+    @web.middleware
+    async def recycle(request, handler):
+        nonlocal served
+        try:
+            return await handler(request)
+        finally:
+            served += 1
+            if served == limit:
+                print(f"\n [worker {os.getpid()}] recycling after {served} requests",
+                      file=sys.stderr)
+                os.kill(os.getpid(), signal.SIGTERM)
+
+    return recycle
+
+
+def run_worker(sock: socket.socket, ready_fd: int):
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+        signal.signal(signum, signal.SIG_DFL)
+    if CONFIG.WARM_UP_RECOGNIZERS:
+        # the pool of the master is not usable after the fork, start the
+        # worker's own from its warm copy of the models
+        BOT.date_parser.warm_up()
+    if CONFIG.WORKER_MAX_REQUESTS:
+        APP.middlewares.append(recycle_middleware(CONFIG.WORKER_MAX_REQUESTS))
+
+    async def notify_ready(app: web.Application):
+        # the master stops the worker this one replaces
+        os.write(ready_fd, b"1")
+        os.close(ready_fd)
+
+    APP.on_startup.append(notify_ready)
+    # run_app stops on SIGINT or SIGTERM, waiting for in-flight requests
+    web.run_app(APP, sock=sock, shutdown_timeout=CONFIG.SHUTDOWN_TIMEOUT,
+                print=None, handle_signals=True)
+
+
+class Master:
+    """ Forks the workers and keeps CONFIG.WORKERS of them running until stopped """
+
+    def __init__(self, sock: socket.socket, workers: int):
+        self.sock = sock
+        self.workers = workers
+        # pid of every running worker and when it was started
+        self.running = {}
+        # pipe each worker writes to once it serves, and the workers that did
+        self.ready_fds = {}
+        self.ready = set()
+        # workers to replace on SIGHUP, and the worker replacing the first one
+        self.reload_queue = []
+        self.replacement = None
+        self.replaced = set()
+        self.stopping = False
+        self.stop_deadline = None
+
+    def spawn(self) -> int:
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                os.close(ready_read)
+                for fd in self.ready_fds.values():
+                    os.close(fd)
+                run_worker(self.sock, ready_write)
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                # _exit skips the atexit hooks, wait for the recognizer
+                # processes here so that they are not left orphaned
+                BOT.date_parser.close()
+                os._exit(status)
+        os.close(ready_write)
+        self.running[pid] = time.monotonic()
+        self.ready_fds[pid] = ready_read
+        return pid
+
+    def stop(self, signum, frame):
+        if self.stopping:
+            return
+        print(f"\n [master] stopping {len(self.running)} workers", file=sys.stderr)
+        self.stopping = True
+        self.stop_deadline = time.monotonic() + CONFIG.SHUTDOWN_TIMEOUT + 5
+        self.signal_workers(signal.SIGTERM)
+
+    def reload(self, signum, frame):
+        print(f"\n [master] replacing {len(self.running)} workers", file=sys.stderr)
+        self.reload_queue = [pid for pid in self.running if pid != self.replacement]
+
+    def replace_next(self):
+        """ Start the replacement of the next worker to reload, stop that worker once it serves """
+        while self.reload_queue and self.reload_queue[0] not in self.running:
+            self.reload_queue.pop(0)
+        if self.stopping or not self.reload_queue:
+            return
+        if self.replacement not in self.running:
+            self.replacement = self.spawn()
+            return
+        if not self.is_ready(self.replacement):
+            return
+        pid = self.reload_queue.pop(0)
+        print(f"\n [master] worker {self.replacement} serves, stopping worker {pid}", file=sys.stderr)
+        self.replaced.add(pid)
+        self.signal_worker(pid, signal.SIGTERM)
+        self.replacement = None
+
+    def is_ready(self, pid) -> bool:
+        fd = self.ready_fds.get(pid)
+        if fd is not None and select.select([fd], [], [], 0)[0]:
+            if os.read(fd, 1):
+                self.ready.add(pid)
+            os.close(fd)
+            del self.ready_fds[pid]
+        return pid in self.ready
+
+    def signal_workers(self, signum):
+        for pid in list(self.running):
+            self.signal_worker(pid, signum)
+
+    def signal_worker(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        while self.running:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            started_at = self.running.pop(pid, None)
+            if started_at is None:
+                continue
+            self.ready.discard(pid)
+            fd = self.ready_fds.pop(pid, None)
+            if fd is not None:
+                os.close(fd)
+            if pid in self.replaced:
+                self.replaced.discard(pid)
+            elif not self.stopping:
+                print(f"\n [master] worker {pid} exited with status {status}, replacing it",
+                      file=sys.stderr)
+                if time.monotonic() - started_at < MIN_WORKER_SECONDS:
+                    time.sleep(MIN_WORKER_SECONDS)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, self.reload)
+        # the master's pool is replaced by one per worker
+        BOT.date_parser.close()
+        print(f"\n [master] serving on {CONFIG.HOST}:{CONFIG.PORT} with {self.workers} workers",
+              file=sys.stderr)
+        while not self.stopping or self.running:
+            while not self.stopping and len(self.running) < self.workers:
+                self.spawn()
+            time.sleep(POLL_INTERVAL)
+            self.reap()
+            self.replace_next()
+            if self.stopping and self.running and time.monotonic() > self.stop_deadline:
+                print(f"\n [master] killing {len(self.running)} workers", file=sys.stderr)
+                self.signal_workers(signal.SIGKILL)
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    Master(create_socket(CONFIG.HOST, CONFIG.PORT), max(CONFIG.WORKERS, 1)).run()